@@ -1,33 +1,37 @@
 # app.py
 import streamlit as st
-import json
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 import os
-import tempfile
+import hashlib
+import importlib
+import importlib.util
+try:
+    import xxhash
+except ModuleNotFoundError:
+    xxhash = None
 from datetime import datetime
 import time
+import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 import numpy as np
 import io
 
 # --- project modules ---
-from src.agents.hs_code_agent import HSCodeAgent
-from src.agents.fallback_analyzer import FallbackAnalyzer
-# --- Guarded import (STEP 2) ---
-try:
-    from src.utils.report_generator import ReportGenerator
-except ModuleNotFoundError:
-    ReportGenerator = None
-
-from src.utils.feedback_manager import FeedbackManager
-from src.utils.analytics import AnalyticsEngine
-from src.utils.duty_calculator import DutyCalculator
-from src.utils.product_enhancer import ProductEnhancer
-from src.utils.image_analyzer import ImageAnalyzer
-from src.utils.enhanced_batch_processor import EnhancedBatchProcessor
-
-# charts
-import plotly.graph_objects as go
-import plotly.express as px  # noqa: F401 (used inside AnalyticsEngine)
+from src.utils import json_io
+from src.utils.classification_cache import product_key, is_cacheable
+from src.utils.history_store import HistoryDatabase, HistoryEntry, HistoryStore
+from config.settings import Config
+
+# The components (HSCodeAgent pulls in LangChain and the Gemini SDK, ReportGenerator
+# pulls in ReportLab), plotly, AnalyticsEngine, ImageAnalyzer and EnhancedBatchProcessor
+# are imported inside the factories/pages that use them, so the script itself
+# stays cheap to import and cold starts don't pay for pages nobody opens.
+# --- Guarded import (STEP 2): PDF export needs ReportLab ---
+REPORTLAB_AVAILABLE = importlib.util.find_spec("reportlab") is not None
+# Pillow is only needed to downscale uploads
+PIL_AVAILABLE = importlib.util.find_spec("PIL") is not None
 
 # =========================
 # Page config
@@ -42,7 +46,10 @@ st.set_page_config(
 # =========================
 # CSS
 # =========================
-st.markdown("""
+# Emitted once per run on purpose: Streamlit drops any element a run doesn't
+# re-send, and cached functions replay their elements anyway, so caching the
+# call wouldn't shrink the payload.
+_APP_CSS = """
 <style>
     .main-header { font-size: 2.5rem; font-weight: 700; color: #1f77b4; margin-bottom: 0.5rem; }
     .sub-header { font-size: 1.2rem; color: #666; margin-bottom: 2rem; }
@@ -53,27 +60,49 @@ st.markdown("""
     .stTabs [data-baseweb="tab-list"] { gap: 2rem; }
     .stTabs [data-baseweb="tab"] { padding: 1rem 2rem; }
 </style>
-""", unsafe_allow_html=True)
+"""
+st.markdown(_APP_CSS, unsafe_allow_html=True)
 
 # =========================
 # Helpers
 # =========================
-def _ensure_widget_defaults():
-    for k in ["product_name_input", "origin_input", "material_input", "description_input", "use_input"]:
-        if k not in st.session_state:
-            st.session_state[k] = ""
+# Session defaults, seeded on every run. Widget-bound keys (the *_input fields,
+# search_depth, enable_fallback) are dropped by Streamlit whenever their page isn't
+# rendered, so this can't be skipped after the first run.
+_DEFAULTS = {
+    "product_name_input": "",
+    "origin_input": "",
+    "material_input": "",
+    "description_input": "",
+    "use_input": "",
+    "classification_complete": False,
+    "auto_filled_data": None,
+    "image_analysis": {},
+    "last_image_sig": None,
+    "enable_fallback": True,
+    "search_depth": 5,
+    "pending_batches": {},
+}
+
+def _ensure_defaults():
+    # Re-seeded every run: widget keys are dropped while their page isn't shown
+    missing = {k: v.copy() if isinstance(v, dict) else v  # sessions never share a mutable default
+               for k, v in _DEFAULTS.items() if k not in st.session_state}
+    if missing:
+        st.session_state.update(missing)
 
 def _apply_to_form_and_widgets(description: str = "", material: str = "", intended_use: str = "", product_name: str = ""):
-    st.session_state.form_description = description or ""
-    st.session_state.form_material = material or ""
-    st.session_state.form_use = intended_use or ""
-    if product_name is not None:
-        st.session_state.product_name_input = product_name or st.session_state.get("product_name_input", "")
-    st.session_state.description_input = st.session_state.form_description
-    st.session_state.material_input = st.session_state.form_material
-    st.session_state.use_input = st.session_state.form_use
+    # The widget keys are the single source of truth for the form fields.
+    st.session_state.update({
+        "product_name_input": product_name or st.session_state.get("product_name_input", ""),
+        "description_input": description or "",
+        "material_input": material or "",
+        "use_input": intended_use or "",
+    })
 
 def _schedule_fill(description: str, material: str, intended_use: str, product_name: str = ""):
+    # Widget keys can't be written once their widgets have rendered in this run. The
+    # image uploader sits below the form, so its fill is applied at the top of the next run.
     st.session_state.pending_fill = {
         "description": description or "",
         "material": material or "",
@@ -81,10 +110,39 @@ def _schedule_fill(description: str, material: str, intended_use: str, product_n
         "product_name": product_name or "",
     }
 
+def _float_conf(x):
+    try:
+        s = str(x).strip()
+        s = s[:-1] if s.endswith("%") else s
+        n = float(s)
+        if 0.0 <= n <= 1.0:
+            n *= 100.0
+        return max(0.0, min(100.0, n))
+    except Exception:
+        return -1.0
+
+def _vec_conf(series: pd.Series) -> pd.Series:
+    """Column-wise _float_conf: '85%', 85 or 0.85 -> 85.0; unparseable -> NaN."""
+    values = pd.to_numeric(series.astype(str).str.strip().str.rstrip('%'), errors='coerce')
+    return values.where(values > 1.0, values * 100.0).clip(0.0, 100.0)
+
+_fmt_usd = "${:,.2f}".format
+
+# Classification history lives in SQLite (src/utils/history_store.py), keyed by the
+# ?hid= id in the URL; each session keeps a HistoryStore with its count and a
+# bounded ring of recent entries.
+def append_history(result: dict):
+    st.session_state.classification_history.append(HistoryEntry(
+        timestamp=result.get("timestamp", datetime.now().isoformat()),
+        product_name=(result.get("product_info") or {}).get("product_name", ""),
+        recommended_code=str(result.get("recommended_code", "")),
+        duty_rate=str(result.get("duty_rate", "N/A")),
+        confidence=max(0.0, _float_conf(result.get("confidence", 0))),
+        needs_review=bool(result.get("needs_review", False)),
+        source=result.get("source", ""),
+    ))
+
 def clear_form():
-    st.session_state.form_material = ""
-    st.session_state.form_description = ""
-    st.session_state.form_use = ""
     st.session_state.auto_filled_data = None
     st.session_state.image_analysis = {}   # dict, not None
     st.session_state.classification_complete = False
@@ -95,42 +153,619 @@ def clear_form():
     st.session_state.use_input = ""
     st.session_state.last_image_sig = None
 
+# Button callbacks run before the page script, while the form widgets can still be
+# written, so their fills show up in the same run without a forced st.rerun().
+def _auto_fill_from_name():
+    name = st.session_state.product_name_input.strip()
+    enhancer = st.session_state.enhancer
+    try:
+        with st.spinner("🤖 AI is analyzing and generating detailed product information..."):
+            enhanced_data = _call_uncached_on_failure(
+                enhance_product_cached,
+                _name_key(name),
+                getattr(enhancer, 'model_name', ''),
+                enhancer,
+                name,
+            )
+    except Exception as e:
+        import traceback
+        st.session_state.auto_fill_status = {"error": f"Exception occurred: {str(e)}",
+                                             "traceback": traceback.format_exc()}
+        return
+
+    if enhanced_data and enhanced_data.get('success', False):
+        _apply_to_form_and_widgets(
+            enhanced_data.get('description', ''),
+            enhanced_data.get('material', ''),
+            enhanced_data.get('intended_use', ''),
+            product_name=st.session_state.product_name_input,
+        )
+        st.session_state.auto_filled_data = enhanced_data
+        st.session_state.auto_fill_status = {
+            "success": f"✨ Details auto-generated using {enhanced_data.get('model_used','AI')}!"
+        }
+    else:
+        error_msg = enhanced_data.get('error', 'Unknown error') if enhanced_data else 'No response from AI'
+        st.session_state.auto_fill_status = {
+            "error": f"Failed to auto-generate: {error_msg}",
+            "debug": enhanced_data if enhanced_data else {"error": "No response"},
+        }
+
+def _clear_auto_fill():
+    st.session_state.auto_filled_data = None
+    _apply_to_form_and_widgets("", "", "", product_name=st.session_state.product_name_input)
+
+# =========================
+# Shared components
+# =========================
+# One instance per process, shared by every session and rerun. Components that
+# carry per-session mutable state (DutyCalculator history, the batch processor's
+# fallback toggle) stay in st.session_state instead.
+@st.cache_resource(show_spinner=False)
+def get_agent():
+    from src.agents.hs_code_agent import HSCodeAgent
+    return HSCodeAgent()
+
+# Built on first use: only low-confidence results (or batch runs with fallback
+# enabled) need it, so session start doesn't pay for it.
+@st.cache_resource(show_spinner=False)
+def get_fallback():
+    from src.agents.fallback_analyzer import FallbackAnalyzer
+    return FallbackAnalyzer()
+
+@st.cache_resource(show_spinner=False)
+def get_feedback_manager():
+    from src.utils.feedback_manager import FeedbackManager
+    return FeedbackManager()
+
+@st.cache_resource(show_spinner=False)
+def get_enhancer():
+    from src.utils.product_enhancer import ProductEnhancer
+    return ProductEnhancer()
+
+@st.cache_resource(show_spinner=False)
+def get_report_generator():
+    # Font registration with ReportLab is process-global; do it once.
+    from src.utils.report_generator import ReportGenerator
+    return ReportGenerator()
+
+def new_duty_calculator():
+    """Per-session calculator; it keeps that session's calculation history."""
+    from src.utils.duty_calculator import DutyCalculator
+    return DutyCalculator()
+
+@st.cache_resource(show_spinner=False)
+def get_history_db():
+    return HistoryDatabase(Config.HISTORY_DB_FILE, retention_days=Config.HISTORY_RETENTION_DAYS)
+
+@st.cache_resource(show_spinner=False)
+def get_image_analyzer():
+    from src.utils.image_analyzer import ImageAnalyzer
+    return ImageAnalyzer()
+
+# Modules only imported when their page is first used
+_DEFERRED_MODULES = (
+    "src.utils.enhanced_batch_processor",
+    "src.utils.report_generator",
+    "src.utils.analytics",
+)
+
+def _prewarm():
+    """Build the image analyzer and import deferred modules off the render path."""
+    try:
+        get_image_analyzer()
+    except Exception:
+        # Missing key/SDK: the upload path reports it when the analyzer is used
+        pass
+    for module in _DEFERRED_MODULES:
+        try:
+            importlib.import_module(module)
+        except Exception:
+            pass
+
+def _start_prewarm():
+    """Once per session, after the page has rendered, warm the slow paths on a daemon thread."""
+    if st.session_state.get('prewarm_started'):
+        return
+    st.session_state.prewarm_started = True
+    thread = threading.Thread(target=_prewarm, name="prewarm", daemon=True)
+    # get_image_analyzer is an st.cache_resource, which expects a script context
+    add_script_run_ctx(thread, get_script_run_ctx())
+    thread.start()
+
+def get_batch_processor():
+    """Per-session batch processor, built the first time the batch page opens."""
+    if 'batch_processor' not in st.session_state:
+        from src.utils.enhanced_batch_processor import EnhancedBatchProcessor
+        # Fallback and concurrency are set per run via for_run()
+        st.session_state.batch_processor = EnhancedBatchProcessor(
+            st.session_state.agent,
+            None,
+            st.session_state.calculator
+        )
+    return st.session_state.batch_processor
+
+@st.cache_resource(show_spinner=False)
+def get_batch_job_executor():
+    """Process-wide worker pool for batch jobs submitted to run in the background."""
+    return ThreadPoolExecutor(max_workers=2, thread_name_prefix="batch-job")
+
+# =========================
+# Background batch jobs
+# =========================
+def _run_batch_job(processor, df, calculate_duties, duty_options, progress):
+    def update_progress(current, total, product_name):
+        progress.update(done=current, total=total)
+    
+    start_time = time.time()
+    results_df = processor.process_batch_with_duties(
+        df, calculate_duties=calculate_duties, progress_callback=update_progress, notify=False, **duty_options
+    )
+    duty_summary = processor.generate_duty_summary(results_df) if calculate_duties else None
+    return results_df, time.time() - start_time, duty_summary
+
+def submit_batch_job(processor, df, calculate_duties, duty_options) -> str:
+    # Random suffix: two submissions in the same second must not share an entry
+    job_id = f"JOB-{datetime.now().strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+    progress = {"done": 0, "total": len(df)}  # written by the worker, read by the status panel
+    future = get_batch_job_executor().submit(
+        _run_batch_job, processor, df.copy(), calculate_duties, duty_options, progress
+    )
+    st.session_state.pending_batches[job_id] = {
+        "future": future,
+        "progress": progress,
+        "rows": len(df),
+        "submitted_at": datetime.now().strftime('%H:%M:%S'),
+        "calculate_duties": calculate_duties,
+    }
+    return job_id
+
+# Low-cardinality result columns the results tab filters and counts on
+_BATCH_CATEGORY_COLS = ('classification_status', 'hs_code', 'origin')
+
+def store_batch_results(results_df, processing_time, calculate_duties, duty_summary=None):
+    # As categoricals, unique() reads the categories and the filter masks compare codes
+    for col in _BATCH_CATEGORY_COLS:
+        if col in results_df.columns:
+            results_df[col] = results_df[col].astype('category')
+    # Remaining text columns go Arrow-backed, so st.dataframe's Arrow conversion is
+    # near zero-copy instead of re-encoding Python strings on every render.
+    # Numeric columns are already contiguous, and mixed/list columns stay as they are.
+    for col in results_df.columns:
+        if (results_df[col].dtype == object
+                and pd.api.types.infer_dtype(results_df[col], skipna=True) in ('string', 'empty')):
+            results_df[col] = results_df[col].astype('string[pyarrow]')
+    st.session_state.batch_results = results_df
+    # Results-tab caches key on this instead of hashing the whole frame. st.cache_data is
+    # shared by every session, so it must be unique per batch, not a per-session counter.
+    st.session_state.batch_results_version = uuid.uuid4().hex
+    # Summary metrics are fixed per batch; work them out once here, not per rerun
+    conf_values = _vec_conf(results_df['confidence'])
+    conf_values = conf_values[conf_values > 0]
+    st.session_state.batch_metrics = {
+        'success_count': int((results_df['classification_status'] == 'Success').sum()),
+        'unique_hs_codes': int(results_df['hs_code'].nunique()),
+        'avg_confidence': float(conf_values.mean()) if not conf_values.empty else 0.0,
+    }
+    for col in ('total_duties', 'total_landed_cost'):
+        if col in results_df.columns:
+            st.session_state.batch_metrics[col] = float(results_df[col].sum())
+    st.session_state.batch_processing_time = processing_time
+    st.session_state.duty_calculation_enabled = calculate_duties
+    if calculate_duties and duty_summary is not None:
+        st.session_state.duty_summary = duty_summary
+
+# xlsxwriter only writes, which is all the exports need, and is much faster than openpyxl
+_XLSX_ENGINE = "xlsxwriter" if importlib.util.find_spec("xlsxwriter") else "openpyxl"
+
+def _column_widths(df: pd.DataFrame) -> list:
+    """Excel column widths: longest header/value + 2, capped at 50."""
+    widths = np.fromiter((len(str(col)) for col in df.columns), dtype=np.int64, count=len(df.columns))
+    if len(df):
+        # one string view of the frame, then a C-level length reduction per column
+        value_lengths = df.astype(str).apply(lambda col: col.str.len().max()).to_numpy(dtype=np.int64)
+        widths = np.maximum(widths, value_lengths)
+    return np.minimum(widths + 2, 50).tolist()
+
+def write_results_workbook(buffer, results_df: pd.DataFrame, summary_df: pd.DataFrame = None):
+    """Write the Results (and optional Summary) sheets with sized columns into buffer."""
+    sheets = {'Results': results_df}
+    if summary_df is not None:
+        sheets['Summary'] = summary_df
+
+    if _XLSX_ENGINE == "xlsxwriter":
+        with pd.ExcelWriter(buffer, engine="xlsxwriter") as writer:
+            for name, df in sheets.items():
+                df.to_excel(writer, index=False, sheet_name=name)
+                worksheet = writer.sheets[name]
+                for idx, width in enumerate(_column_widths(df)):
+                    worksheet.set_column(idx, idx, width)
+        return
+
+    # openpyxl fallback in write-only mode: rows stream straight to XML instead of
+    # every cell being kept as an object until save, so memory stays flat for big batches
+    from openpyxl import Workbook
+    from openpyxl.utils import get_column_letter
+
+    workbook = Workbook(write_only=True)
+    for name, df in sheets.items():
+        worksheet = workbook.create_sheet(name)
+        for idx, width in enumerate(_column_widths(df), start=1):
+            worksheet.column_dimensions[get_column_letter(idx)].width = width
+        worksheet.append([str(col) for col in df.columns])
+        cells = df.astype(object).where(df.notna(), None)
+        for row in cells.itertuples(index=False, name=None):
+            worksheet.append(row)
+    workbook.save(buffer)
+
+def _batch_summary_frame(results_df: pd.DataFrame, summary: dict) -> pd.DataFrame:
+    return pd.DataFrame({
+        'Metric': [
+            'Total Products',
+            'Successful Classifications',
+            'Total Customs Value',
+            'Total Import Duties',
+            'Total Landed Cost',
+            'Average Effective Duty Rate',
+            'Products with Duties',
+            'Duty-Free Products'
+        ],
+        'Value': [
+            len(results_df),
+            len(results_df[results_df['classification_status'] == 'Success']),
+            f"${summary.get('total_customs_value', 0):,.2f}",
+            f"${summary.get('total_duties', 0):,.2f}",
+            f"${summary.get('total_landed_cost', 0):,.2f}",
+            f"{summary.get('average_effective_rate', 0):.2f}%",
+            summary.get('products_with_duties', 0),
+            summary.get('products_duty_free', 0)
+        ]
+    })
+
+# Export payloads for the results tab, keyed on (batch version, filter values)
+# so reruns that change neither reuse the serialized bytes.
+@st.cache_data(max_entries=4, show_spinner=False)
+def export_csv_cached(results_version: str, filters: tuple, _results_df: pd.DataFrame) -> str:
+    return _results_df.to_csv(index=False)
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def export_json_cached(results_version: str, filters: tuple, _results_df: pd.DataFrame) -> str:
+    return _results_df.to_json(orient='records', indent=2, date_format='iso')
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def export_xlsx_cached(results_version: str, filters: tuple, _results_df: pd.DataFrame, _summary: dict = None) -> bytes:
+    summary_df = _batch_summary_frame(_results_df, _summary) if _summary is not None else None
+    excel_buffer = io.BytesIO()
+    write_results_workbook(excel_buffer, _results_df, summary_df)
+    return excel_buffer.getvalue()
+
+# Duty analysis charts, built once per batch (the summary is stored with the results)
+@st.cache_data(max_entries=4, show_spinner=False)
+def duty_components_figure(results_version: str, _summary: dict):
+    if _summary.get('total_duties', 0) <= 0:
+        return None
+    import plotly.graph_objects as go
+    fig_pie = go.Figure(data=[go.Pie(
+        labels=['Base Duty', 'MPF', 'HMF'],
+        values=[_summary.get('total_base_duty', 0), _summary.get('total_mpf', 0), _summary.get('total_hmf', 0)],
+        hole=.3
+    )])
+    fig_pie.update_layout(
+        title="Duty Components Breakdown",
+        height=350
+    )
+    return fig_pie
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def duty_by_country_figure(results_version: str, _summary: dict):
+    bar = _summary.get('duty_by_country_bar')
+    if bar is None:
+        # summaries stored before the bar arrays were added
+        by_country = (_summary.get('duty_by_country') or {}).get('total_duties', {})
+        bar = {'countries': list(by_country.keys()), 'duties': list(by_country.values())}
+    if not bar['countries']:
+        return None
+    import plotly.graph_objects as go
+    fig_bar = go.Figure(data=[
+        go.Bar(x=bar['countries'], y=bar['duties'], marker_color='lightblue')
+    ])
+    fig_bar.update_layout(
+        title="Total Duties by Origin Country",
+        xaxis_title="Country",
+        yaxis_title="Total Duties ($)",
+        height=350
+    )
+    return fig_bar
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def batch_filter_options(results_version: str, _results_df: pd.DataFrame):
+    """(statuses, hs_codes, origins) for the results filters, computed once per batch."""
+    statuses = _results_df['classification_status'].unique().tolist()
+    hs_codes = np.sort(np.asarray(_results_df['hs_code'].unique(), dtype=object)).tolist()
+    origins = []
+    if 'origin' in _results_df.columns:
+        origins = np.sort(np.asarray(_results_df['origin'].dropna().unique(), dtype=object)).tolist()
+    return statuses, hs_codes, origins
+
+def _collect_finished_batch_jobs() -> list:
+    """Move results of finished jobs into the session; returns (level, message) notices."""
+    pending = st.session_state.pending_batches
+    notices = []
+    for job_id in [j for j, job in pending.items() if job["future"].done()]:
+        job = pending.pop(job_id)
+        try:
+            results_df, processing_time, duty_summary = job["future"].result()
+        except Exception as e:
+            notices.append(("error", f"❌ {job_id} failed: {str(e)}"))
+            continue
+        store_batch_results(results_df, processing_time, job["calculate_duties"], duty_summary)
+        notices.append(("success", f"✅ {job_id} complete! {len(results_df)} products classified in {processing_time:.1f} seconds. "
+                                   "See the 'Results & Duties' tab."))
+    return notices
+
+def _pending_jobs_panel():
+    pending = st.session_state.pending_batches
+    if not pending:
+        return
+    
+    st.subheader("⏳ Background Jobs")
+    for job_id, job in pending.items():
+        done, total = job["progress"]["done"], job["progress"]["total"]
+        st.progress(done / total if total else 0.0,
+                    text=f"**{job_id}** · {done}/{total} products · submitted {job['submitted_at']}")
+    
+    check_clicked = st.button("🔄 Check Batch Status", key="check_batch_status")
+    if check_clicked or any(job["future"].done() for job in pending.values()):
+        notices = _collect_finished_batch_jobs()
+        if notices:
+            # Results live outside this panel; rerun the app once so the tabs pick them up
+            st.session_state.batch_job_notices = notices
+            st.rerun()
+    st.markdown("---")
+
+def show_pending_batch_jobs():
+    for level, message in st.session_state.pop('batch_job_notices', []):
+        getattr(st, level)(message)
+    
+    if st.session_state.pending_batches:
+        # Only this panel refreshes while jobs run, not the rest of the page
+        st.fragment(_pending_jobs_panel, run_every=3)()
+
+# =========================
+# Cached model calls
+# =========================
+class _UncachedResult(Exception):
+    """Carries a failed model response out of a cached function so it is not memoized."""
+    def __init__(self, result):
+        super().__init__(result.get("error", "") if isinstance(result, dict) else "")
+        self.result = result
+
+def _call_uncached_on_failure(fn, *args):
+    try:
+        return fn(*args)
+    except _UncachedResult as e:
+        return e.result
+
+def _content_signature(data: bytes) -> str:
+    # Only used to detect a changed upload / key caches, so a fast non-cryptographic hash is enough.
+    if xxhash is not None:
+        return xxhash.xxh3_128_hexdigest(data)
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+@st.cache_data(ttl=3600, max_entries=512, show_spinner=False)
+def classify_product_cached(key: str, _agent, _product_info: dict) -> dict:
+    """Full RAG + LLM classification keyed on the canonical product hash."""
+    result = _agent.classify_product(_product_info) or {}
+    if not is_cacheable(result):
+        raise _UncachedResult(result)
+    return result
+
+@st.cache_data(ttl=3600, max_entries=512, show_spinner=False)
+def enhance_and_classify_cached(key: str, _agent, _product_info: dict) -> dict:
+    """Name-only classification: details inferred and code chosen in one model call."""
+    result = _agent.enhance_and_classify(_product_info) or {}
+    if not is_cacheable(result):
+        raise _UncachedResult(result)
+    return result
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def read_upload_cached(file_name: str, content_sig: str, _processor, _data: bytes) -> pd.DataFrame:
+    """Parsed batch upload; reruns with the same file skip re-parsing."""
+    return _processor.read_uploaded_file(file_name, _data)
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def count_unique_products_cached(content_sig: str, _processor, _df: pd.DataFrame) -> int:
+    """Distinct products in an upload; hashes every row, so once per file rather than per rerun."""
+    return _processor.count_unique_products(_df)
+
+IMAGE_MAX_EDGE = 1024
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def downscale_image_cached(image_sig: str, mime: str, _image_bytes: bytes):
+    """
+    Shrink an upload to at most IMAGE_MAX_EDGE px (JPEG q85) for the preview and
+    the vision call; returns (bytes, mime). Small or unreadable images pass through.
+    """
+    if not PIL_AVAILABLE:
+        return _image_bytes, mime
+    from PIL import Image, ImageOps
+    try:
+        img = Image.open(io.BytesIO(_image_bytes))
+        if max(img.size) <= IMAGE_MAX_EDGE and len(_image_bytes) <= 512 * 1024:
+            return _image_bytes, mime
+        img = ImageOps.exif_transpose(img).convert("RGB")
+        img.thumbnail((IMAGE_MAX_EDGE, IMAGE_MAX_EDGE), Image.LANCZOS)
+        buf = io.BytesIO()
+        img.save(buf, "JPEG", quality=85)
+        return buf.getvalue(), "image/jpeg"
+    except Exception:
+        return _image_bytes, mime
+
+@st.cache_data(ttl=86400, max_entries=256, show_spinner=False)
+def analyze_image_cached(image_sig: str, mime: str, analyzer_version: str, _analyzer, _image_bytes: bytes) -> dict:
+    """Image analysis keyed on the content signature; the bytes themselves are not re-hashed."""
+    result = _analyzer.analyze_product_image_bytes(_image_bytes, mime)
+    if not result.get("success"):
+        raise _UncachedResult(result)
+    return result
+
+@st.cache_resource(max_entries=101, show_spinner=False)
+def _confidence_gauge(value: int):
+    """Confidence gauge for one whole-percent value; at most 101 are ever built and they are never mutated"""
+    import plotly.graph_objects as go
+    fig = go.Figure(go.Indicator(
+        mode="gauge+number", value=value, domain={'x': [0, 1], 'y': [0, 1]},
+        title={'text': "Confidence Score"},
+        gauge={'axis': {'range': [None, 100]},
+               'bar': {'color': "darkblue"},
+               'steps': [{'range': [0, 60], 'color': "lightgray"},
+                         {'range': [60, 80], 'color': "gray"},
+                         {'range': [80, 100], 'color': "lightgreen"}],
+               'threshold': {'line': {'color': "red", 'width': 4}, 'thickness': 0.75, 'value': 80}}
+    ))
+    fig.update_layout(height=250)
+    return fig
+
+def _name_key(product_name: str) -> str:
+    """Case/whitespace-insensitive cache key, so 'LED Lamp' and 'led  lamp ' share an entry."""
+    return " ".join(str(product_name).split()).lower()
+
+@st.cache_data(ttl=86400, max_entries=1000, show_spinner=False)
+def enhance_product_cached(name_key: str, enhancer_version: str, _enhancer, _product_name: str) -> dict:
+    result = _enhancer.enhance_product_info(_product_name)
+    if not result or not result.get("success", False):
+        raise _UncachedResult(result)
+    return result
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def feedback_stats_cached(feedback_version: int, _feedback_manager):
+    """(feedback count, accuracy %) for the sidebar, computed once per feedback version."""
+    stats = _feedback_manager.get_accuracy_stats()
+    if not stats:
+        return 0, None
+    return int(stats['total_classifications']), float(stats['accuracy'])
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def analytics_report_cached(feedback_version: int, _feedback_manager) -> dict:
+    """Every analytics figure and table for one version of the feedback data."""
+    from src.utils.analytics import AnalyticsEngine
+    analytics = AnalyticsEngine(_feedback_manager)
+    df = analytics.df
+    if df.empty:
+        return {"empty": True}
+    return {
+        "empty": False,
+        "stats": analytics.get_overview_stats(),
+        "confidence": analytics.get_confidence_distribution(),
+        "accuracy_by_confidence": analytics.get_accuracy_by_confidence(),
+        "ratings": analytics.get_rating_distribution(),
+        "trends": analytics.get_classification_trends(),
+        "top_codes": analytics.get_top_hs_codes(limit=15),
+        "misclassifications": analytics.get_misclassification_report(),
+        "feedback_json": df.to_json(orient='records', indent=2),
+        "feedback_csv": df.to_csv(index=False),
+    }
+
 # =========================
 # Session state init
 # =========================
+def _history_id() -> str:
+    """
+    Browser-side history key, kept in the URL (?hid=...) so a refresh or a
+    server restart picks the same history back up; new visitors get a new id.
+    """
+    hid = st.query_params.get("hid", "")
+    if len(hid) != 32 or any(c not in "0123456789abcdef" for c in hid):
+        hid = uuid.uuid4().hex
+        st.query_params["hid"] = hid
+    return hid
+
 if 'classification_history' not in st.session_state:
-    st.session_state.classification_history = []
+    st.session_state.classification_history = HistoryStore(
+        get_history_db(), _history_id(), recent_size=Config.HISTORY_RECENT_SIZE
+    )
 
-if 'agent' not in st.session_state:
+# Independent constructors (model clients, data loads), built concurrently so a
+# cold start waits for the slowest one rather than the sum of all of them.
+_COMPONENT_FACTORIES = {
+    "agent": get_agent,
+    "feedback_manager": get_feedback_manager,
+    "calculator": new_duty_calculator,
+    "enhancer": get_enhancer,
+}
+
+def _init_errors() -> tuple:
+    """
+    What the constructors raise for bad config, missing packages, unreachable
+    services or API errors; anything else is a bug and should surface as one.
+    Only evaluated once a constructor has failed, so the SDKs stay off the
+    first-paint import path.
+    """
+    errors = [ImportError, OSError, ValueError, RuntimeError, KeyError]
+    try:
+        from google.api_core.exceptions import GoogleAPIError
+        errors.append(GoogleAPIError)
+    except ImportError:
+        pass
+    try:
+        from pinecone.exceptions import PineconeException
+        errors.append(PineconeException)
+    except ImportError:
+        pass
+    return tuple(errors)
+
+def _start_component_init() -> dict:
+    """Submit every component factory to worker threads and return their futures."""
+    ctx = get_script_run_ctx()
+    pool = ThreadPoolExecutor(
+        max_workers=len(_COMPONENT_FACTORIES),
+        thread_name_prefix="component-init",
+        # st.cache_resource expects to run inside the session's script context
+        initializer=lambda: add_script_run_ctx(threading.current_thread(), ctx),
+    )
+    futures = {name: pool.submit(factory) for name, factory in _COMPONENT_FACTORIES.items()}
+    pool.shutdown(wait=False)
+    return futures
+
+def _finish_component_init():
+    """Wait for the background init (after the sidebar and header have painted)."""
+    futures = st.session_state.pop('init_futures', None)
+    if futures is None:
+        return
     with st.spinner("Initializing AI components..."):
-        try:
-            st.session_state.agent = HSCodeAgent()
-            st.session_state.fallback = FallbackAnalyzer()
-            st.session_state.feedback_manager = FeedbackManager()
-            st.session_state.calculator = DutyCalculator()
-            st.session_state.enhancer = ProductEnhancer()
-            st.session_state.image_analyzer = ImageAnalyzer()
-            # Initialize batch processor
-            st.session_state.batch_processor = EnhancedBatchProcessor(
-                st.session_state.agent,
-                st.session_state.fallback,
-                st.session_state.calculator
-            )
-            st.session_state.init_success = True
-        except Exception as e:
-            st.error(f"Failed to initialize components: {str(e)}")
-            st.session_state.init_success = False
-
-st.session_state.setdefault('form_material', "")
-st.session_state.setdefault('form_description', "")
-st.session_state.setdefault('form_use', "")
-st.session_state.setdefault('classification_complete', False)
-st.session_state.setdefault('auto_filled_data', None)
-st.session_state.setdefault('image_analysis', {})
-st.session_state.setdefault('last_image_sig', None)
-st.session_state.setdefault('enable_fallback', True)
-st.session_state.setdefault('search_depth', 5)
-_ensure_widget_defaults()
+        components = {}
+        for name, future in futures.items():
+            try:
+                components[name] = future.result()
+            except _init_errors() as e:
+                st.error(f"Failed to initialize {name}: {type(e).__name__}: {e}")
+                st.session_state.init_success = False
+                return
+        st.session_state.update(components)
+        st.session_state.init_success = True
+
+# Settings without which no component can be constructed
+_REQUIRED_ENV = {
+    "GOOGLE_API_KEY": Config.GOOGLE_API_KEY or os.getenv("GEMINI_API_KEY"),
+    "PINECONE_API_KEY": Config.PINECONE_API_KEY,
+}
+
+def _validate_env():
+    """Stop with a clear message before any model client or index is built."""
+    missing = [name for name, value in _REQUIRED_ENV.items() if not value]
+    if missing:
+        st.error(f"⚠️ Missing configuration: {', '.join(missing)}. "
+                 "Set them in your environment or .env file and restart the app.")
+        st.stop()
+
+_validate_env()
+
+# Kick off construction without blocking; main() paints the sidebar first and
+# only then waits for the components.
+if 'agent' not in st.session_state and 'init_futures' not in st.session_state:
+    st.session_state.init_futures = _start_component_init()
+
+_ensure_defaults()
 
 # =========================
 # App
@@ -151,13 +786,15 @@ def main():
 
         st.markdown("---")
         st.subheader("Quick Stats")
-        if st.session_state.classification_history:
-            st.metric("Classifications", len(st.session_state.classification_history))
-            feedback_df = st.session_state.feedback_manager.get_all_feedback()
-            if not feedback_df.empty:
-                accuracy = st.session_state.feedback_manager.get_accuracy_stats()
-                if accuracy:
-                    st.metric("Accuracy", f"{accuracy['accuracy']:.1f}%")
+        if st.session_state.classification_history.count():
+            st.metric("Classifications", st.session_state.classification_history.count())
+            # The sidebar paints before the background init is awaited, so the
+            # feedback manager may not exist yet on a session's first run
+            feedback_manager = st.session_state.get('feedback_manager')
+            if feedback_manager is not None:
+                feedback_count, accuracy = feedback_stats_cached(feedback_manager.version, feedback_manager)
+                if feedback_count:
+                    st.metric("Accuracy", f"{accuracy:.1f}%")
         else:
             st.info("No classifications yet")
 
@@ -168,10 +805,13 @@ def main():
         st.markdown("---")
         st.caption("v1.0.0 | AI-Powered Classification")
 
+    _finish_component_init()
     if not st.session_state.get('init_success', False):
         st.error("⚠️ System initialization failed. Please check your API keys and configuration.")
         st.stop()
 
+    # Each page is a fragment: widget interactions rerun only the active page,
+    # not the sidebar or session bootstrap above. st.rerun() still reruns the app.
     if page == "🔍 Classifier":
         show_classifier_page()
     elif page == "📋 Batch Process":
@@ -183,6 +823,7 @@ def main():
     elif page == "📚 About":
         show_about_page()
 
+@st.fragment
 def show_classifier_page():
     if 'pending_fill' in st.session_state:
         pf = st.session_state.pending_fill
@@ -201,9 +842,8 @@ def show_classifier_page():
         col1, col2, col3 = st.columns([1, 2, 1])
         with col2:
             st.success("✅ Previous classification saved!")
-            if st.button("🆕 Start New Classification", type="primary", use_container_width=True):
-                clear_form()
-                st.rerun()
+            st.button("🆕 Start New Classification", type="primary", use_container_width=True,
+                      on_click=clear_form)
         st.markdown("---")
 
     st.subheader("Product Information")
@@ -218,37 +858,28 @@ def show_classifier_page():
         )
     with col2:
         st.write(""); st.write("")
-        auto_fill_clicked = st.button(
+        st.button(
             "🤖 Auto-Fill",
             type="secondary",
             use_container_width=True,
             key="auto_fill_btn",
-            disabled=not st.session_state.product_name_input.strip()
+            disabled=not st.session_state.product_name_input.strip(),
+            on_click=_auto_fill_from_name
         )
 
-    if auto_fill_clicked:
-        with st.spinner("🤖 AI is analyzing and generating detailed product information..."):
-            try:
-                enhanced_data = st.session_state.enhancer.enhance_product_info(st.session_state.product_name_input)
-                if enhanced_data and enhanced_data.get('success', False):
-                    desc = enhanced_data.get('description', '')
-                    mat = enhanced_data.get('material', '')
-                    use = enhanced_data.get('intended_use', '')
-                    _schedule_fill(desc, mat, use, product_name=st.session_state.product_name_input)
-                    st.session_state.auto_filled_data = enhanced_data
-                    st.success(f"✨ Details auto-generated using {enhanced_data.get('model_used','AI')}!")
-                    st.rerun()
-                else:
-                    error_msg = enhanced_data.get('error', 'Unknown error') if enhanced_data else 'No response from AI'
-                    st.error(f"❌ Failed to auto-generate: {error_msg}")
-                    with st.expander("🔧 Debug Information"):
-                        st.json(enhanced_data if enhanced_data else {"error": "No response"})
-                        st.info("Tips: Check your API key and internet connection")
-            except Exception as e:
-                st.error(f"❌ Exception occurred: {str(e)}")
+    auto_fill_status = st.session_state.pop('auto_fill_status', None)
+    if auto_fill_status:
+        if 'success' in auto_fill_status:
+            st.success(auto_fill_status['success'])
+        else:
+            st.error(f"❌ {auto_fill_status['error']}")
+            if 'traceback' in auto_fill_status:
                 with st.expander("🔧 Full Error Details"):
-                    import traceback
-                    st.code(traceback.format_exc())
+                    st.code(auto_fill_status['traceback'])
+            else:
+                with st.expander("🔧 Debug Information"):
+                    st.json(auto_fill_status['debug'])
+                    st.info("Tips: Check your API key and internet connection")
 
     if st.session_state.auto_filled_data and not st.session_state.classification_complete:
         model_info = st.session_state.auto_filled_data.get('model_used', '')
@@ -285,10 +916,7 @@ def show_classifier_page():
         )
 
     if st.session_state.get('auto_filled_data') and not st.session_state.classification_complete:
-        if st.button("🔄 Clear Auto-Fill", key="clear_autofill"):
-            st.session_state.auto_filled_data = None
-            _schedule_fill("", "", "", product_name=st.session_state.product_name_input)
-            st.rerun()
+        st.button("🔄 Clear Auto-Fill", key="clear_autofill", on_click=_clear_auto_fill)
 
     st.markdown("---")
     st.subheader("🖼️ Product Image Analysis (Optional)")
@@ -300,24 +928,24 @@ def show_classifier_page():
     )
 
     if uploaded_file is not None:
-      st.image(uploaded_file, caption="Uploaded Product Image", use_column_width=True)
-
-    if uploaded_file is not None:
-        try:
-            file_bytes = uploaded_file.getvalue()
-            image_sig = f"{uploaded_file.name}:{len(file_bytes)}"
-        except Exception:
-            image_sig = uploaded_file.name
+        # Read the upload once; preview and analysis share the downscaled bytes
+        file_bytes = uploaded_file.getvalue()
+        image_sig = _content_signature(file_bytes)
+        image_bytes, image_mime = downscale_image_cached(image_sig, uploaded_file.type or "image/jpeg", file_bytes)
+        st.image(image_bytes, caption="Uploaded Product Image", use_column_width=True)
 
         if st.session_state.get("last_image_sig") != image_sig:
             with st.spinner("🖼️ Auto-analyzing the product image..."):
                 try:
-                    with tempfile.NamedTemporaryFile(delete=False, suffix=".jpg") as tmp_file:
-                        tmp_file.write(file_bytes)
-                        tmp_path = tmp_file.name
-
-                    image_result = st.session_state.image_analyzer.analyze_product_image(tmp_path)
-                    os.unlink(tmp_path)
+                    analyzer = get_image_analyzer()
+                    image_result = _call_uncached_on_failure(
+                        analyze_image_cached,
+                        image_sig,
+                        image_mime,
+                        getattr(analyzer, 'model_name', ''),
+                        analyzer,
+                        image_bytes,
+                    )
 
                     if image_result.get("success"):
                         st.session_state.image_analysis = image_result
@@ -385,31 +1013,39 @@ def show_classifier_page():
         use_value    = st.session_state.use_input.strip()
         origin       = st.session_state.origin_input.strip()
 
-        if not product_name or not description:
-            st.error("⚠️ Please enter at least Product Name and Description")
+        product_info = {
+            'product_name': product_name,
+            'description': description,
+            'material': material,
+            'use': use_value,
+            'origin': origin
+        }
+        # Re-clicking with unchanged inputs just shows the result we already have
+        request_key = f"{product_key(product_info)}:{st.session_state.enable_fallback}"
+
+        if not product_name:
+            st.error("⚠️ Please enter at least a Product Name")
+        elif (st.session_state.get('current_request_key') == request_key
+              and st.session_state.get('current_result') is not None):
+            display_results(st.session_state.current_result, product_info)
         else:
             with st.spinner("🤖 Analyzing product and applying GRI rules..."):
                 try:
-                    product_info = {
-                        'product_name': product_name,
-                        'description': description,
-                        'material': material,
-                        'use': use_value,
-                        'origin': origin
-                    }
-
-                    result = st.session_state.agent.classify_product(product_info) or {}
-
-                    def _float_conf(x):
-                        try:
-                            s = str(x).strip()
-                            s = s[:-1] if s.endswith("%") else s
-                            n = float(s)
-                            if 0.0 <= n <= 1.0:
-                                n *= 100.0
-                            return max(0.0, min(100.0, n))
-                        except Exception:
-                            return -1.0
+                    # With only a name, infer the details and classify in one call
+                    # instead of an Auto-Fill round trip followed by a classify round trip
+                    name_only = not description
+                    result = _call_uncached_on_failure(
+                        enhance_and_classify_cached if name_only else classify_product_cached,
+                        product_key(product_info),
+                        st.session_state.agent,
+                        product_info,
+                    )
+                    if name_only and result.get('product_info'):
+                        product_info = {**product_info, **result['product_info']}
+                        inferred = (product_info['description'], product_info['material'], product_info['use'])
+                        if any(inferred):
+                            _schedule_fill(*inferred, product_name=product_name)
+                            st.info("✨ Inferred the product details from the name; they are filled into the form.")
 
                     rec_code = str(result.get('recommended_code', '')).strip().upper()
                     conf_val = _float_conf(result.get('confidence', -1))
@@ -418,7 +1054,7 @@ def show_classifier_page():
 
                     if st.session_state.enable_fallback and missing_or_low:
                         st.info("🔁 No strong DB match. Using LLM fallback…")
-                        result = st.session_state.fallback.analyze_unknown_product(product_info)
+                        result = get_fallback().analyze_unknown_product(product_info)
 
                     if 'confidence' not in result:
                         result['confidence'] = f"{max(0.0, conf_val):.0f}%"
@@ -430,9 +1066,10 @@ def show_classifier_page():
 
                     result['timestamp'] = datetime.now().isoformat()
                     result['product_info'] = product_info
-                    st.session_state.classification_history.append(result)
+                    append_history(result)
                     st.session_state.current_result = result
                     st.session_state.current_product_info = product_info
+                    st.session_state.current_request_key = request_key
                     st.session_state.classification_complete = True
 
                     display_results(result, product_info)
@@ -442,14 +1079,16 @@ def show_classifier_page():
                     with st.expander("🔧 Error Details"):
                         import traceback
                         st.code(traceback.format_exc())
+    elif st.session_state.classification_complete and st.session_state.get('current_result') is not None:
+        # Keep the last result on screen across reruns (e.g. the PDF prepare click)
+        display_results(st.session_state.current_result, st.session_state.current_product_info)
 
 def display_results(result, product_info):
     st.success("✅ Classification Complete!")
     col1, col2, col3 = st.columns([1, 2, 1])
     with col2:
-        if st.button("🆕 New Classification", type="primary", use_container_width=True):
-            clear_form()
-            st.rerun()
+        st.button("🆕 New Classification", type="primary", use_container_width=True,
+                  on_click=clear_form)
 
     st.subheader("Recommended HS Code")
     col1, col2, col3 = st.columns(3)
@@ -469,43 +1108,47 @@ def display_results(result, product_info):
         color_class = "confidence-high" if confidence_val >= 80 else ("confidence-medium" if confidence_val >= 60 else "confidence-low")
         st.markdown(f'<h3 class="{color_class}">{confidence_val:.0f}%</h3>', unsafe_allow_html=True)
 
-    fig = go.Figure(go.Indicator(
-        mode="gauge+number", value=confidence_val, domain={'x': [0, 1], 'y': [0, 1]},
-        title={'text': "Confidence Score"},
-        gauge={'axis': {'range': [None, 100]},
-               'bar': {'color': "darkblue"},
-               'steps': [{'range': [0, 60], 'color': "lightgray"},
-                         {'range': [60, 80], 'color': "gray"},
-                         {'range': [80, 100], 'color': "lightgreen"}],
-               'threshold': {'line': {'color': "red", 'width': 4}, 'thickness': 0.75, 'value': 80}}
-    ))
-    fig.update_layout(height=250)
-    st.plotly_chart(fig, use_container_width=True)
+    st.plotly_chart(_confidence_gauge(int(round(max(0.0, min(100.0, confidence_val))))),
+                    use_container_width=True)
 
     st.subheader("Classification Reasoning")
     st.write(result.get('reasoning', 'No reasoning provided'))
 
+    # Each list below is sent as one element rather than several per row
     if result.get('alternatives'):
         st.subheader("Alternative HS Codes")
-        for alt in result['alternatives']:
-            st.write(f"- `{alt}`")
+        st.markdown("\n".join(f"- `{alt}`" for alt in result['alternatives']))
 
     if result.get('hts_candidates'):
         with st.expander("📊 HTS Database Matches"):
-            for i, candidate in enumerate(result['hts_candidates'], 1):
-                st.markdown(f"**{i}. {candidate['hs_code']}** (Relevance: {candidate['relevance_score']:.2f})")
-                st.write(f"Description: {candidate['description']}")
-                st.write(f"Duty Rate: {candidate['duty_rate']}")
-                st.divider()
+            candidates = pd.DataFrame(result['hts_candidates'],
+                                      columns=['hs_code', 'description', 'duty_rate', 'relevance_score'])
+            st.dataframe(
+                candidates,
+                use_container_width=True,
+                hide_index=True,
+                column_config={
+                    'hs_code': "HS Code",
+                    'description': "Description",
+                    'duty_rate': "Duty Rate",
+                    'relevance_score': st.column_config.NumberColumn("Relevance", format="%.2f"),
+                },
+            )
 
     if result.get('cross_rulings'):
         with st.expander("📚 Relevant CROSS Rulings"):
-            for ruling in result['cross_rulings']:
-                st.markdown(f"**{ruling['ruling_number']}** - {ruling['date']}")
-                st.write(f"HS Code: `{ruling['hs_code']}`")
-                st.write(f"Summary: {ruling['description'][:200]}...")
-                st.link_button("View Full Ruling", ruling['url'])
-                st.divider()
+            st.markdown("\n\n---\n\n".join(
+                f"**{ruling['ruling_number']}** - {ruling['date']}  \n"
+                f"HS Code: `{ruling['hs_code']}`  \n"
+                f"Summary: {ruling['description'][:200]}...  \n"
+                f"[View Full Ruling]({ruling['url']})"
+                for ruling in result['cross_rulings']
+            ))
+
+    if result.get('source') == 'semantic_cache':
+        st.info(f"♻️ **Reused classification**: this result was borrowed from a previously classified product "
+                f"with the same material and use ({result.get('semantic_similarity', 0):.0%} description similarity). "
+                "The reasoning and matches below describe that product; confirm the code applies here.")
 
     if result.get('needs_review'):
         st.warning("⚠️ **Low Confidence Detection**: This classification should be reviewed by a customs broker.")
@@ -515,13 +1158,13 @@ def display_results(result, product_info):
 
     # JSON export works even without ReportLab
     with col1:
-        if ReportGenerator is None:
+        if not REPORTLAB_AVAILABLE:
             # build JSON manually (no PDF dependency)
             data = {"generated_at": datetime.now().isoformat(),
                     "product": product_info, "classification": result}
-            json_report = json.dumps(data, indent=2, ensure_ascii=False)
+            json_report = json_io.dumps(data)
         else:
-            rg = ReportGenerator()
+            rg = get_report_generator()
             json_report = rg.generate_json_report(result, product_info)
 
         st.download_button(
@@ -534,22 +1177,28 @@ def display_results(result, product_info):
 
     # PDF export is shown only if ReportLab is installed
     with col2:
-        if ReportGenerator is None:
+        if not REPORTLAB_AVAILABLE:
             st.error("📄 PDF export disabled: install `reportlab` and redeploy.\n\n"
                      "Add `reportlab>=4.2.0` to requirements.txt.")
         else:
-            try:
-                rg = ReportGenerator()
-                pdf_bytes = rg.generate_pdf_report(result, product_info)
-                st.download_button(
-                    label="📄 Download PDF Report",
-                    data=pdf_bytes,
-                    file_name=f"hs_code_{product_info['product_name'].replace(' ', '_')}_{datetime.now().strftime('%Y%m%d')}.pdf",
-                    mime="application/pdf",
-                    key="pdf_download"
-                )
-            except Exception as e:
-                st.error(f"📄 PDF export failed: {e}")
+            # Building the PDF is the slowest part of this page, so only do it once asked
+            report_id = f"{product_key(product_info)}:{result.get('recommended_code', '')}"
+            if st.session_state.get('pdf_report_for') != report_id:
+                if st.button("📄 Prepare PDF Report", key="pdf_prepare"):
+                    st.session_state.pdf_report_for = report_id
+            if st.session_state.get('pdf_report_for') == report_id:
+                try:
+                    # Served from the generator's content cache on later reruns
+                    pdf_bytes = get_report_generator().generate_pdf_report(result, product_info)
+                    st.download_button(
+                        label="📄 Download PDF Report",
+                        data=pdf_bytes,
+                        file_name=f"hs_code_{product_info['product_name'].replace(' ', '_')}_{datetime.now().strftime('%Y%m%d')}.pdf",
+                        mime="application/pdf",
+                        key="pdf_download"
+                    )
+                except Exception as e:
+                    st.error(f"📄 PDF export failed: {e}")
                 with st.expander("How to fix PDF export"):
                     st.write(
                         "Add Unicode TTF fonts (DejaVuSans.ttf and DejaVuSans-Bold.ttf) under "
@@ -559,7 +1208,9 @@ def display_results(result, product_info):
     st.markdown("---")
     display_feedback_section(result, product_info)
 
+@st.fragment
 def display_feedback_section(result, product_info):
+    """Feedback form; its widgets rerun only this section, not the results above it."""
     st.subheader("📝 Help Us Improve")
     st.write("Your feedback helps improve classification accuracy for everyone!")
 
@@ -600,18 +1251,215 @@ def display_feedback_section(result, product_info):
             feedback_id = st.session_state.feedback_manager.add_feedback(classification_data, user_feedback)
             st.success(f"✅ Thank you for your feedback! (ID: {feedback_id})")
 
+@st.fragment
+def show_batch_results_tab():
+    """Results tab of the batch page; filter and column changes rerun only this tab."""
+    if 'batch_results' not in st.session_state:
+        st.info("📤 Please upload and process a file first")
+    else:
+        st.subheader("📋 Classification & Duty Results")
+        
+        results_df = st.session_state.batch_results
+        has_duties = st.session_state.get('duty_calculation_enabled', False)
+        
+        # Summary metrics
+        metrics = st.session_state.get('batch_metrics', {})
+        col1, col2, col3, col4 = st.columns(4)
+        
+        with col1:
+            success_count = metrics.get('success_count', 0)
+            st.metric(
+                "Successful Classifications",
+                f"{success_count}/{len(results_df)}",
+                f"{(success_count/len(results_df)*100):.0f}%"
+            )
+        
+        with col2:
+            # Average confidence
+            avg_conf = metrics.get('avg_confidence', 0)
+            st.metric("Avg Confidence", f"{avg_conf:.0f}%")
+        
+        with col3:
+            if has_duties and 'total_duties' in results_df.columns:
+                total_duties = metrics.get('total_duties', 0.0)
+                st.metric("Total Duties", f"${total_duties:,.2f}")
+            else:
+                unique_codes = metrics.get('unique_hs_codes', 0)
+                st.metric("Unique HS Codes", unique_codes)
+        
+        with col4:
+            if has_duties and 'total_landed_cost' in results_df.columns:
+                total_landed = metrics.get('total_landed_cost', 0.0)
+                st.metric("Total Landed Cost", f"${total_landed:,.2f}")
+            else:
+                processing_time = st.session_state.get('batch_processing_time', 0)
+                st.metric("Processing Time", f"{processing_time:.1f}s")
+        
+        # Display options
+        st.subheader("📊 Results Table")
+        
+        # Column selection based on whether duties were calculated
+        if has_duties:
+            default_cols = ['product_name', 'hs_code', 'confidence', 'duty_rate', 
+                           'customs_value', 'total_duties', 'total_landed_cost']
+        else:
+            default_cols = ['product_name', 'hs_code', 'confidence', 'duty_rate', 
+                           'classification_status']
+        
+        # Filter out columns that don't exist
+        default_cols = [col for col in default_cols if col in results_df.columns]
+        
+        display_cols = st.multiselect(
+            "Select columns to display",
+            options=results_df.columns.tolist(),
+            default=default_cols,
+            key="results_display_cols"
+        )
+        
+        # Filters
+        status_options, hs_options, origin_options = batch_filter_options(
+            st.session_state.get('batch_results_version', ''), results_df
+        )
+        col1, col2, col3 = st.columns(3)
+        
+        with col1:
+            status_filter = st.selectbox(
+                "Filter by Status",
+                ["All"] + status_options,
+                key="status_filter"
+            )
+        
+        with col2:
+            hs_filter = st.selectbox(
+                "Filter by HS Code",
+                ["All"] + hs_options,
+                key="hs_filter"
+            )
+        
+        with col3:
+            if 'origin' in results_df.columns:
+                origin_filter = st.selectbox(
+                    "Filter by Origin",
+                    ["All"] + origin_options,
+                    key="origin_filter"
+                )
+            else:
+                origin_filter = "All"
+        
+        # Apply filters: one combined mask, one slice. The filtered and displayed
+        # frames are kept in session state and only rebuilt when the batch,
+        # a filter or the column selection changes.
+        results_version = st.session_state.get('batch_results_version', '')
+        filter_key = (results_version, status_filter, hs_filter, origin_filter)
+        if st.session_state.get('results_filter_key') != filter_key:
+            mask = np.ones(len(results_df), dtype=bool)
+            if status_filter != "All":
+                mask &= (results_df['classification_status'] == status_filter).to_numpy(dtype=bool, na_value=False)
+            if hs_filter != "All":
+                mask &= (results_df['hs_code'] == hs_filter).to_numpy(dtype=bool, na_value=False)
+            if origin_filter != "All" and 'origin' in results_df.columns:
+                mask &= (results_df['origin'] == origin_filter).to_numpy(dtype=bool, na_value=False)
+            st.session_state.results_filtered_df = results_df if mask.all() else results_df[mask]
+            st.session_state.results_filter_key = filter_key
+        filtered_df = st.session_state.results_filtered_df
+        
+        # Display filtered results
+        if len(filtered_df) < len(results_df):
+            st.info(f"Showing {len(filtered_df)} of {len(results_df)} products")
+        
+        if display_cols:
+            display_key = filter_key + (tuple(display_cols),)
+            if st.session_state.get('results_display_key') != display_key:
+                st.session_state.results_display_df = filtered_df[list(display_cols)]
+                st.session_state.results_display_key = display_key
+            display_df = st.session_state.results_display_df
+            
+            # Currency columns stay numeric (and sortable); the frontend formats them
+            currency_cols = ['customs_value', 'base_duty', 'total_duties', 'total_landed_cost', 
+                            'mpf', 'hmf', 'unit_value']
+            currency_config = {col: st.column_config.NumberColumn(format="$%.2f")
+                               for col in currency_cols if col in display_df.columns}
+            
+            st.dataframe(
+                display_df,
+                use_container_width=True,
+                height=400,
+                hide_index=True,
+                column_config=currency_config
+            )
+        
+        # Export section
+        st.subheader("📥 Export Options")
+        # Payloads are rebuilt only when the batch or the filters change
+        export_filters = (status_filter, hs_filter, origin_filter)
+        
+        col1, col2, col3, col4 = st.columns(4)
+        
+        with col1:
+            # CSV export
+            csv_data = export_csv_cached(results_version, export_filters, filtered_df)
+            st.download_button(
+                label="📄 CSV Export",
+                data=csv_data,
+                file_name=f"batch_results_{datetime.now().strftime('%Y%m%d_%H%M')}.csv",
+                mime="text/csv"
+            )
+        
+        with col2:
+            # Excel export with multiple sheets. Writing the workbook (and importing
+            # the Excel engine) is the slowest export, so it waits for a click.
+            excel_request = (results_version, export_filters)
+            if st.session_state.get('excel_export_for') != excel_request:
+                if st.button("📊 Prepare Excel", key="prepare_excel"):
+                    st.session_state.excel_export_for = excel_request
+            if st.session_state.get('excel_export_for') == excel_request:
+                excel_data = export_xlsx_cached(
+                    results_version, export_filters, filtered_df,
+                    st.session_state.duty_summary if has_duties and 'duty_summary' in st.session_state else None
+                )
+                st.download_button(
+                    label="📊 Excel Export",
+                    data=excel_data,
+                    file_name=f"batch_results_{datetime.now().strftime('%Y%m%d_%H%M')}.xlsx",
+                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                )
+        
+        with col3:
+            # JSON export
+            json_data = export_json_cached(results_version, export_filters, filtered_df)
+            st.download_button(
+                label="📋 JSON Export",
+                data=json_data,
+                file_name=f"batch_results_{datetime.now().strftime('%Y%m%d_%H%M')}.json",
+                mime="application/json"
+            )
+        
+        with col4:
+            # Duty report (if applicable)
+            if has_duties and 'duty_summary' in st.session_state:
+                duty_report = json_io.dumps(st.session_state.duty_summary, default=str)
+                st.download_button(
+                    label="💰 Duty Report",
+                    data=duty_report,
+                    file_name=f"duty_report_{datetime.now().strftime('%Y%m%d_%H%M')}.json",
+                    mime="application/json"
+                )
+
+@st.fragment
 def show_batch_processing_page():
     """Enhanced batch processing page with duty calculation"""
     
     st.markdown('<div class="main-header">📋 Batch Classification & Duty Calculator</div>', unsafe_allow_html=True)
     st.markdown('<div class="sub-header">Process multiple products and calculate duties at once</div>', unsafe_allow_html=True)
     
-    processor = st.session_state.batch_processor
+    processor = get_batch_processor()
     
     # Tabs for different workflows
     tab1, tab2, tab3 = st.tabs(["📤 Upload & Process", "📊 Results & Duties", "📈 Duty Analysis"])
     
     with tab1:
+        show_pending_batch_jobs()
+        
         # Template section
         st.subheader("📥 Download Template")
         col1, col2, col3 = st.columns([2, 1, 1])
@@ -652,10 +1500,9 @@ def show_batch_processing_page():
         if uploaded_file is not None:
             try:
                 # Read file
-                if uploaded_file.name.endswith('.csv'):
-                    df = pd.read_csv(uploaded_file)
-                else:
-                    df = pd.read_excel(uploaded_file)
+                file_bytes = uploaded_file.getvalue()
+                content_sig = _content_signature(file_bytes)
+                df = read_upload_cached(uploaded_file.name, content_sig, processor, file_bytes)
                 
                 # Store in session state
                 st.session_state.uploaded_df = df
@@ -678,6 +1525,9 @@ def show_batch_processing_page():
                 col1, col2, col3 = st.columns(3)
                 with col1:
                     st.metric("Total Products", len(df))
+                    unique_products = count_unique_products_cached(content_sig, processor, df)
+                    if unique_products < len(df):
+                        st.caption(f"Deduplicated {len(df)} → {unique_products} unique products (each is classified once)")
                 with col2:
                     if has_duty_data and 'customs_value' in df.columns:
                         total_value = df['customs_value'].sum() if 'customs_value' in df.columns else 0
@@ -697,7 +1547,12 @@ def show_batch_processing_page():
                 )
                 
                 if preview_cols:
-                    st.dataframe(df[preview_cols].head(10), use_container_width=True, height=300)
+                    # Only the 10-row slice goes to the browser; re-slice when the file or columns change
+                    preview_key = (content_sig, tuple(preview_cols))
+                    if st.session_state.get('preview_key') != preview_key:
+                        st.session_state.preview_df = df.head(10)[preview_cols]
+                        st.session_state.preview_key = preview_key
+                    st.dataframe(st.session_state.preview_df, use_container_width=True, height=300)
                 
                 # Processing options
                 st.subheader("⚙️ Processing Options")
@@ -719,6 +1574,20 @@ def show_batch_processing_page():
                         value=5,
                         help="Number of candidates to consider"
                     )
+                    
+                    max_concurrency = st.slider(
+                        "Concurrent Requests",
+                        min_value=1,
+                        max_value=32,
+                        value=min(32, max(1, Config.BATCH_MAX_CONCURRENCY)),
+                        help="Classification requests in flight at once. Lower this if you hit API rate limits."
+                    )
+                    
+                    batch_mode = st.checkbox(
+                        "Submit as Background Job",
+                        value=len(df) > 100,
+                        help="Run the batch in the background instead of waiting on this page. Use 'Check Batch Status' to collect the results."
+                    )
                 
                 with col2:
                     st.write("**Duty Calculation Settings**")
@@ -745,58 +1614,61 @@ def show_batch_processing_page():
                 
                 # Process button
                 if st.button("🚀 Start Batch Processing", type="primary", use_container_width=True):
-                    # Progress tracking
-                    progress_bar = st.progress(0)
-                    status_text = st.empty()
+                    # Settings are fixed per run; a background job keeps its own copy
+                    processor = processor.for_run(
+                        fallback_analyzer=get_fallback() if enable_fallback else None,
+                        max_concurrency=max_concurrency
+                    )
                     
-                    def update_progress(current, total, product_name):
-                        progress = current / total
-                        progress_bar.progress(progress)
-                        status_text.text(f"Processing {current}/{total}: {product_name[:50]}...")
+                    duty_options = dict(
+                        shipping_method=shipping_method,
+                        include_mpf=include_mpf,
+                        include_hmf=include_hmf
+                    ) if calculate_duties else {}
                     
-                    # Process batch
-                    with st.spinner("Processing batch..."):
-                        start_time = time.time()
+                    if batch_mode:
+                        job_id = submit_batch_job(processor, df, calculate_duties, duty_options)
+                        st.success(f"📨 Submitted {job_id} with {len(df)} products. Use 'Check Batch Status' at the top of this tab to collect the results.")
+                    else:
+                        # Progress tracking
+                        progress_bar = st.progress(0)
+                        status_text = st.empty()
                         
-                        # Configure processor
-                        processor.fallback = st.session_state.fallback if enable_fallback else None
+                        def update_progress(current, total, product_name):
+                            progress = current / total
+                            progress_bar.progress(progress)
+                            status_text.text(f"Classified {current}/{total}: {product_name[:50]}")
+                        
+                        # Process batch
+                        with st.spinner("Processing batch..."):
+                            start_time = time.time()
                         
-                        # Process with or without duties
-                        if calculate_duties:
-                            results_df = processor.process_batch_with_duties(
-                                df,
-                                calculate_duties=True,
-                                shipping_method=shipping_method,
-                                include_mpf=include_mpf,
-                                include_hmf=include_hmf,
-                                progress_callback=update_progress
-                            )
-                        else:
                             results_df = processor.process_batch_with_duties(
                                 df,
-                                calculate_duties=False,
-                                progress_callback=update_progress
+                                calculate_duties=calculate_duties,
+                                progress_callback=update_progress,
+                                **duty_options
                             )
                         
-                        processing_time = time.time() - start_time
-                    
-                    # Clear progress
-                    progress_bar.empty()
-                    status_text.empty()
-                    
-                    # Store results
-                    st.session_state.batch_results = results_df
-                    st.session_state.batch_processing_time = processing_time
-                    st.session_state.duty_calculation_enabled = calculate_duties
-                    
-                    if calculate_duties:
-                        st.session_state.duty_summary = processor.generate_duty_summary(results_df)
-                    
-                    st.success(f"✅ Processing complete! {len(results_df)} products classified in {processing_time:.1f} seconds")
-                    st.balloons()
-                    
-                    # Auto-switch to results tab
-                    st.info("📊 Switch to the 'Results & Duties' tab to view your results")
+                            processing_time = time.time() - start_time
+                        
+                        # Clear progress
+                        progress_bar.empty()
+                        status_text.empty()
+                        
+                        # Store results
+                        store_batch_results(
+                            results_df,
+                            processing_time,
+                            calculate_duties,
+                            processor.generate_duty_summary(results_df) if calculate_duties else None
+                        )
+                        
+                        st.success(f"✅ Processing complete! {len(results_df)} products classified in {processing_time:.1f} seconds")
+                        st.balloons()
+                        
+                        # Auto-switch to results tab
+                        st.info("📊 Switch to the 'Results & Duties' tab to view your results")
                     
             except Exception as e:
                 st.error(f"Error reading file: {str(e)}")
@@ -804,225 +1676,7 @@ def show_batch_processing_page():
                     st.code(str(e))
     
     with tab2:
-        if 'batch_results' not in st.session_state:
-            st.info("📤 Please upload and process a file first")
-        else:
-            st.subheader("📋 Classification & Duty Results")
-            
-            results_df = st.session_state.batch_results
-            has_duties = st.session_state.get('duty_calculation_enabled', False)
-            
-            # Summary metrics
-            col1, col2, col3, col4 = st.columns(4)
-            
-            with col1:
-                success_count = len(results_df[results_df['classification_status'] == 'Success'])
-                st.metric(
-                    "Successful Classifications",
-                    f"{success_count}/{len(results_df)}",
-                    f"{(success_count/len(results_df)*100):.0f}%"
-                )
-            
-            with col2:
-                # Average confidence
-                conf_values = []
-                for conf in results_df['confidence']:
-                    try:
-                        val = float(str(conf).replace('%', ''))
-                        if val > 0:
-                            conf_values.append(val)
-                    except:
-                        pass
-                avg_conf = sum(conf_values) / len(conf_values) if conf_values else 0
-                st.metric("Avg Confidence", f"{avg_conf:.0f}%")
-            
-            with col3:
-                if has_duties and 'total_duties' in results_df.columns:
-                    total_duties = results_df['total_duties'].sum()
-                    st.metric("Total Duties", f"${total_duties:,.2f}")
-                else:
-                    unique_codes = results_df['hs_code'].nunique()
-                    st.metric("Unique HS Codes", unique_codes)
-            
-            with col4:
-                if has_duties and 'total_landed_cost' in results_df.columns:
-                    total_landed = results_df['total_landed_cost'].sum()
-                    st.metric("Total Landed Cost", f"${total_landed:,.2f}")
-                else:
-                    processing_time = st.session_state.get('batch_processing_time', 0)
-                    st.metric("Processing Time", f"{processing_time:.1f}s")
-            
-            # Display options
-            st.subheader("📊 Results Table")
-            
-            # Column selection based on whether duties were calculated
-            if has_duties:
-                default_cols = ['product_name', 'hs_code', 'confidence', 'duty_rate', 
-                               'customs_value', 'total_duties', 'total_landed_cost']
-            else:
-                default_cols = ['product_name', 'hs_code', 'confidence', 'duty_rate', 
-                               'classification_status']
-            
-            # Filter out columns that don't exist
-            default_cols = [col for col in default_cols if col in results_df.columns]
-            
-            display_cols = st.multiselect(
-                "Select columns to display",
-                options=results_df.columns.tolist(),
-                default=default_cols,
-                key="results_display_cols"
-            )
-            
-            # Filters
-            col1, col2, col3 = st.columns(3)
-            
-            with col1:
-                status_filter = st.selectbox(
-                    "Filter by Status",
-                    ["All"] + results_df['classification_status'].unique().tolist(),
-                    key="status_filter"
-                )
-            
-            with col2:
-                hs_filter = st.selectbox(
-                    "Filter by HS Code",
-                    ["All"] + sorted(results_df['hs_code'].unique().tolist()),
-                    key="hs_filter"
-                )
-            
-            with col3:
-                if 'origin' in results_df.columns:
-                    origin_filter = st.selectbox(
-                        "Filter by Origin",
-                        ["All"] + sorted(results_df['origin'].dropna().unique().tolist()),
-                        key="origin_filter"
-                    )
-                else:
-                    origin_filter = "All"
-            
-            # Apply filters
-            filtered_df = results_df.copy()
-            
-            if status_filter != "All":
-                filtered_df = filtered_df[filtered_df['classification_status'] == status_filter]
-            if hs_filter != "All":
-                filtered_df = filtered_df[filtered_df['hs_code'] == hs_filter]
-            if origin_filter != "All" and 'origin' in filtered_df.columns:
-                filtered_df = filtered_df[filtered_df['origin'] == origin_filter]
-            
-            # Display filtered results
-            if len(filtered_df) < len(results_df):
-                st.info(f"Showing {len(filtered_df)} of {len(results_df)} products")
-            
-            if display_cols:
-                # Format currency columns for display
-                display_df = filtered_df[display_cols].copy()
-                
-                # Format currency columns if they exist
-                currency_cols = ['customs_value', 'base_duty', 'total_duties', 'total_landed_cost', 
-                                'mpf', 'hmf', 'unit_value']
-                for col in currency_cols:
-                    if col in display_df.columns:
-                        display_df[col] = display_df[col].apply(lambda x: f"${x:,.2f}" if pd.notna(x) and x != 0 else "$0.00")
-                
-                st.dataframe(
-                    display_df,
-                    use_container_width=True,
-                    height=400,
-                    hide_index=True
-                )
-            
-            # Export section
-            st.subheader("📥 Export Options")
-            
-            col1, col2, col3, col4 = st.columns(4)
-            
-            with col1:
-                # CSV export
-                csv_data = filtered_df.to_csv(index=False)
-                st.download_button(
-                    label="📄 CSV Export",
-                    data=csv_data,
-                    file_name=f"batch_results_{datetime.now().strftime('%Y%m%d_%H%M')}.csv",
-                    mime="text/csv"
-                )
-            
-            with col2:
-                # Excel export with multiple sheets
-                excel_buffer = io.BytesIO()
-                with pd.ExcelWriter(excel_buffer, engine='openpyxl') as writer:
-                    # Main results
-                    filtered_df.to_excel(writer, index=False, sheet_name='Results')
-                    
-                    # Summary sheet
-                    if has_duties and 'duty_summary' in st.session_state:
-                        summary = st.session_state.duty_summary
-                        summary_data = {
-                            'Metric': [
-                                'Total Products',
-                                'Successful Classifications',
-                                'Total Customs Value',
-                                'Total Import Duties',
-                                'Total Landed Cost',
-                                'Average Effective Duty Rate',
-                                'Products with Duties',
-                                'Duty-Free Products'
-                            ],
-                            'Value': [
-                                len(filtered_df),
-                                len(filtered_df[filtered_df['classification_status'] == 'Success']),
-                                f"${summary.get('total_customs_value', 0):,.2f}",
-                                f"${summary.get('total_duties', 0):,.2f}",
-                                f"${summary.get('total_landed_cost', 0):,.2f}",
-                                f"{summary.get('average_effective_rate', 0):.2f}%",
-                                summary.get('products_with_duties', 0),
-                                summary.get('products_duty_free', 0)
-                            ]
-                        }
-                        pd.DataFrame(summary_data).to_excel(writer, index=False, sheet_name='Summary')
-                    
-                    # Format columns
-                    for sheet in writer.sheets.values():
-                        for column in sheet.columns:
-                            max_length = 0
-                            column_letter = column[0].column_letter
-                            for cell in column:
-                                try:
-                                    if len(str(cell.value)) > max_length:
-                                        max_length = len(str(cell.value))
-                                except:
-                                    pass
-                            adjusted_width = min(max_length + 2, 50)
-                            sheet.column_dimensions[column_letter].width = adjusted_width
-                
-                excel_data = excel_buffer.getvalue()
-                st.download_button(
-                    label="📊 Excel Export",
-                    data=excel_data,
-                    file_name=f"batch_results_{datetime.now().strftime('%Y%m%d_%H%M')}.xlsx",
-                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                )
-            
-            with col3:
-                # JSON export
-                json_data = filtered_df.to_json(orient='records', indent=2, date_format='iso')
-                st.download_button(
-                    label="📋 JSON Export",
-                    data=json_data,
-                    file_name=f"batch_results_{datetime.now().strftime('%Y%m%d_%H%M')}.json",
-                    mime="application/json"
-                )
-            
-            with col4:
-                # Duty report (if applicable)
-                if has_duties and 'duty_summary' in st.session_state:
-                    duty_report = json.dumps(st.session_state.duty_summary, indent=2, default=str)
-                    st.download_button(
-                        label="💰 Duty Report",
-                        data=duty_report,
-                        file_name=f"duty_report_{datetime.now().strftime('%Y%m%d_%H%M')}.json",
-                        mime="application/json"
-                    )
+        show_batch_results_tab()
     
     with tab3:
         if 'duty_summary' not in st.session_state:
@@ -1066,40 +1720,21 @@ def show_batch_processing_page():
             
             # Duty distribution charts
             st.subheader("📊 Duty Distribution")
+            results_version = st.session_state.get('batch_results_version', '')
             
             col1, col2 = st.columns(2)
             
             with col1:
                 # Pie chart of duty components
-                if summary.get('total_duties', 0) > 0:
-                    fig_pie = go.Figure(data=[go.Pie(
-                        labels=['Base Duty', 'MPF', 'HMF'],
-                        values=[summary.get('total_base_duty', 0), summary.get('total_mpf', 0), summary.get('total_hmf', 0)],
-                        hole=.3
-                    )])
-                    fig_pie.update_layout(
-                        title="Duty Components Breakdown",
-                        height=350
-                    )
+                fig_pie = duty_components_figure(results_version, summary)
+                if fig_pie is not None:
                     st.plotly_chart(fig_pie, use_container_width=True)
             
             with col2:
                 # Bar chart of duties by country
-                if summary.get('duty_by_country'):
-                    countries = list(summary['duty_by_country'].get('total_duties', {}).keys())
-                    duties = list(summary['duty_by_country'].get('total_duties', {}).values())
-                    
-                    if countries and duties:
-                        fig_bar = go.Figure(data=[
-                            go.Bar(x=countries, y=duties, marker_color='lightblue')
-                        ])
-                        fig_bar.update_layout(
-                            title="Total Duties by Origin Country",
-                            xaxis_title="Country",
-                            yaxis_title="Total Duties ($)",
-                            height=350
-                        )
-                        st.plotly_chart(fig_bar, use_container_width=True)
+                fig_bar = duty_by_country_figure(results_version, summary)
+                if fig_bar is not None:
+                    st.plotly_chart(fig_bar, use_container_width=True)
             
             # Top duty items
             if summary.get('highest_duty_items'):
@@ -1108,17 +1743,18 @@ def show_batch_processing_page():
                 
                 # Format currency columns
                 for col in ['customs_value', 'total_duties']:
-                    if col in highest_df.columns:
-                        highest_df[col] = highest_df[col].apply(lambda x: f"${x:,.2f}")
+                    if col in highest_df.columns and not highest_df.empty:
+                        highest_df[col] = highest_df[col].map(_fmt_usd)
                 
                 st.table(highest_df)
 
+@st.fragment
 def show_duty_calculator_page():
     st.markdown('<div class="main-header">💰 Duty & Fee Calculator</div>', unsafe_allow_html=True)
     st.markdown('<div class="sub-header">Calculate import duties and fees for your shipments</div>', unsafe_allow_html=True)
 
     calculator = st.session_state.calculator
-    last_classification = st.session_state.classification_history[-1] if st.session_state.classification_history else None
+    last_classification = st.session_state.classification_history.last()
 
     tab1, tab2, tab3 = st.tabs(["💵 Simple Calculator", "📄 Invoice-Based", "⚖️ Rate Comparison"])
 
@@ -1130,8 +1766,8 @@ def show_duty_calculator_page():
                                             help="Total value of goods (CIF: Cost + Insurance + Freight)",
                                             key="simple_customs_value")
             default_rate = "0%"
-            if last_classification and 'duty_rate' in last_classification:
-                default_rate = last_classification['duty_rate']
+            if last_classification and last_classification.duty_rate:
+                default_rate = last_classification.duty_rate
             duty_rate = st.text_input("Duty Rate", value=default_rate,
                                       help="Enter rate from HTS (e.g., '5.5%' or 'Free')",
                                       key="simple_duty_rate")
@@ -1243,23 +1879,15 @@ def display_duty_results(result, calculator):
     st.subheader("Fee Breakdown")
     breakdown_df = {
         "Fee Type": ["Base Duty", "MPF", "HMF"],
-        "Amount": [
-            calculator.format_currency(result['base_duty']),
-            calculator.format_currency(result['mpf']),
-            calculator.format_currency(result['hmf'])
-        ],
-        "Rate": [
-            result['duty_rate_applied'],
-            f"{calculator.MPF_RATE*100:.4f}%",
-            f"{calculator.HMF_RATE*100:.3f}%"
-        ]
+        "Amount": [_fmt_usd(result['base_duty']), _fmt_usd(result['mpf']), _fmt_usd(result['hmf'])],
+        "Rate": [result['duty_rate_applied'], calculator.MPF_RATE_LABEL, calculator.HMF_RATE_LABEL]
     }
     st.table(breakdown_df)
 
     col1, col2 = st.columns(2)
     with col1:
         if st.button("📥 Download Calculation (JSON)", key="download_calc"):
-            json_str = json.dumps(result, indent=2)
+            json_str = json_io.dumps(result)
             st.download_button(
                 label="Download",
                 data=json_str,
@@ -1268,20 +1896,58 @@ def display_duty_results(result, calculator):
                 key="download_calc_btn"
             )
 
+@st.cache_data(max_entries=8, show_spinner=False)
+def history_frame_cached(history_id: str, count: int, _history) -> pd.DataFrame:
+    """This history id's rows from SQLite; re-read only after a new classification"""
+    return _history.all()
+
+def show_history_section():
+    history = st.session_state.classification_history
+    st.header("🕘 Your Classification History")
+    if not history.count():
+        st.info("No classifications recorded yet.")
+        st.markdown("---")
+        return
+
+    df = history_frame_cached(history.session_id, history.count(), history)
+    col1, col2, col3 = st.columns(3)
+    with col1: st.metric("Classifications", f"{len(df):,}")
+    with col2: st.metric("Flagged for Review", f"{int(df['needs_review'].sum()):,}")
+    with col3: st.metric("Avg Confidence", f"{float(df['confidence'].mean()):.1f}%")
+    st.dataframe(
+        df.iloc[::-1],  # newest first
+        use_container_width=True,
+        hide_index=True,
+        column_config={
+            'timestamp': "Time",
+            'product_name': "Product",
+            'recommended_code': "HS Code",
+            'duty_rate': "Duty Rate",
+            'confidence': st.column_config.NumberColumn("Confidence", format="%.0f%%"),
+            'needs_review': "Needs Review",
+            'source': "Source",
+        },
+    )
+    st.markdown("---")
+
+@st.fragment
 def show_analytics_page():
     st.markdown('<div class="main-header">📊 Classification Analytics Dashboard</div>', unsafe_allow_html=True)
     st.markdown('<div class="sub-header">Track performance and improve accuracy over time</div>', unsafe_allow_html=True)
 
+    show_history_section()
+
     feedback_manager = st.session_state.feedback_manager
-    analytics = AnalyticsEngine(feedback_manager)
+    # Recomputed only when feedback has been added since the last render
+    report = analytics_report_cached(feedback_manager.version, feedback_manager)
 
-    if feedback_manager.get_all_feedback().empty:
+    if report["empty"]:
         st.info("📭 No feedback data yet. Start classifying products and collecting feedback to see analytics!")
         st.markdown("### Get Started\n1. Go to the Classifier page\n2. Classify some products\n3. Provide feedback on the results\n4. Return here to see insights!")
         return
 
     st.header("Overview")
-    stats = analytics.get_overview_stats()
+    stats = report["stats"]
     col1, col2, col3, col4 = st.columns(4)
     with col1: st.metric("Total Classifications", f"{stats['total_classifications']:,}")
     with col2: st.metric("Accuracy Rate", f"{stats['accuracy_rate']:.1f}%")
@@ -1292,21 +1958,21 @@ def show_analytics_page():
     st.header("Performance Analysis")
     col1, col2 = st.columns(2)
     with col1:
-        conf_fig = analytics.get_confidence_distribution()
+        conf_fig = report["confidence"]
         if conf_fig: st.plotly_chart(conf_fig, use_container_width=True)
     with col2:
-        acc_conf_fig = analytics.get_accuracy_by_confidence()
+        acc_conf_fig = report["accuracy_by_confidence"]
         if acc_conf_fig: st.plotly_chart(acc_conf_fig, use_container_width=True)
-    rating_fig = analytics.get_rating_distribution()
+    rating_fig = report["ratings"]
     if rating_fig: st.plotly_chart(rating_fig, use_container_width=True)
     st.header("Usage Trends")
-    trend_fig = analytics.get_classification_trends()
+    trend_fig = report["trends"]
     if trend_fig: st.plotly_chart(trend_fig, use_container_width=True)
     st.header("Most Common Classifications")
-    top_codes_fig = analytics.get_top_hs_codes(limit=15)
+    top_codes_fig = report["top_codes"]
     if top_codes_fig: st.plotly_chart(top_codes_fig, use_container_width=True)
     st.header("⚠️ Misclassification Report")
-    misclass_report = analytics.get_misclassification_report()
+    misclass_report = report["misclassifications"]
     if misclass_report is not None and not misclass_report.empty:
         st.write(f"Found {len(misclass_report)} misclassifications")
         st.dataframe(misclass_report, use_container_width=True, hide_index=True)
@@ -1321,24 +1987,22 @@ def show_analytics_page():
     st.markdown("---")
     st.subheader("Export Data")
     col1, col2 = st.columns(2)
-    df = feedback_manager.get_all_feedback()
-    if not df.empty:
-        with col1:
-            st.download_button(
-                label="📥 Download All Feedback (JSON)",
-                data=df.to_json(orient='records', indent=2),
-                file_name=f"feedback_data_{datetime.now().strftime('%Y%m%d')}.json",
-                mime="application/json",
-                key="download_json"
-            )
-        with col2:
-            st.download_button(
-                label="📥 Download All Feedback (CSV)",
-                data=df.to_csv(index=False),
-                file_name=f"feedback_data_{datetime.now().strftime('%Y%m%d')}.csv",
-                mime="text/csv",
-                key="download_csv"
-            )
+    with col1:
+        st.download_button(
+            label="📥 Download All Feedback (JSON)",
+            data=report["feedback_json"],
+            file_name=f"feedback_data_{datetime.now().strftime('%Y%m%d')}.json",
+            mime="application/json",
+            key="download_json"
+        )
+    with col2:
+        st.download_button(
+            label="📥 Download All Feedback (CSV)",
+            data=report["feedback_csv"],
+            file_name=f"feedback_data_{datetime.now().strftime('%Y%m%d')}.csv",
+            mime="text/csv",
+            key="download_csv"
+        )
 
 def show_about_page():
     st.markdown('<div class="main-header">📚 About HS Code Classifier</div>', unsafe_allow_html=True)
@@ -1356,4 +2020,5 @@ def show_about_page():
     """)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
+    _start_prewarm()
\ No newline at end of file
@@ -29,6 +29,25 @@ class Config:
     # ---- Confidence threshold ----
     CONFIDENCE_THRESHOLD = float(os.getenv("CONFIDENCE_THRESHOLD", "0.80"))
 
+    # ---- Batch processing ----
+    # Max classification requests in flight at once during batch runs
+    BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "8"))
+    # Products packed into a single Gemini prompt during batch runs
+    BATCH_PROMPT_SIZE = int(os.getenv("BATCH_PROMPT_SIZE", "16"))
+
+    # ---- Semantic result cache ----
+    # Cosine similarity of query embeddings at which an earlier result is reused
+    # (set above 1 to disable), and how many results the agent keeps
+    SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+    SEMANTIC_CACHE_SIZE = int(os.getenv("SEMANTIC_CACHE_SIZE", "512"))
+
+    # ---- Classification history ----
+    HISTORY_DB_FILE = os.getenv("HISTORY_DB_FILE", "data/history/classification_history.db")
+    # Entries each session keeps in memory; older ones are only on disk
+    HISTORY_RECENT_SIZE = int(os.getenv("HISTORY_RECENT_SIZE", "100"))
+    # Rows older than this are deleted when the app starts (0 keeps everything)
+    HISTORY_RETENTION_DAYS = int(os.getenv("HISTORY_RETENTION_DAYS", "30"))
+
 # handy instance (optional)
 settings = Config()
 
@@ -7,9 +7,13 @@ try:
 except Exception as e:
     genai = None
 
+from src.utils.genai_client import configure_genai
+
+_JSON_OBJECT_RE = re.compile(r"\{[\s\S]*\}")
+
 
 def _extract_first_json(text: str) -> dict:
-    m = re.search(r"\{[\s\S]*\}", text)
+    m = _JSON_OBJECT_RE.search(text)
     if not m:
         raise ValueError("No JSON object found in model response.")
     return json.loads(m.group(0))
@@ -40,7 +44,7 @@ class FallbackAnalyzer:
         if genai is None:
             raise RuntimeError("Please install google-generativeai.")
 
-        genai.configure(api_key=api_key)
+        configure_genai(api_key)
         self.model_name = model_name or os.environ.get("GEMINI_TEXT_MODEL", "gemini-2.5-flash")
         self.model = genai.GenerativeModel(self.model_name)
 
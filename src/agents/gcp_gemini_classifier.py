@@ -5,10 +5,27 @@ from config.gcp_settings import GCPConfig
 import json
 import logging
 import os
+import re
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Keyword rules for offline classification, in priority order
+_FALLBACK_RULES = [
+    ('t-shirt', {'code': '6109.10.00', 'rate': '16.5%', 'desc': 'T-shirts, singlets, tank tops'}),
+    ('shirt', {'code': '6205.20.00', 'rate': '19.7%', 'desc': 'Men\'s or boys\' shirts'}),
+    ('jeans', {'code': '6203.42.40', 'rate': '16.6%', 'desc': 'Trousers of cotton'}),
+    ('pants', {'code': '6203.42.40', 'rate': '16.6%', 'desc': 'Trousers'}),
+    ('dress', {'code': '6204.42.00', 'rate': '16.0%', 'desc': 'Women\'s dresses'}),
+    ('shoes', {'code': '6403.99.60', 'rate': '10.0%', 'desc': 'Footwear'}),
+    ('laptop', {'code': '8471.30.01', 'rate': '0.0%', 'desc': 'Portable computers'}),
+    ('phone', {'code': '8517.12.00', 'rate': '0.0%', 'desc': 'Telephones for cellular networks'}),
+    ('watch', {'code': '9102.11.00', 'rate': '6.0%', 'desc': 'Wrist watches'}),
+    ('bag', {'code': '4202.22.00', 'rate': '17.6%', 'desc': 'Handbags'}),
+]
+_FALLBACK_RULE_INDEX = {keyword: i for i, (keyword, _) in enumerate(_FALLBACK_RULES)}
+_FALLBACK_PATTERN = re.compile('|'.join(re.escape(keyword) for keyword, _ in _FALLBACK_RULES))
+
 class GCPGeminiClassifier:
     def __init__(self):
         try:
@@ -110,30 +127,18 @@ Important: Return ONLY the JSON object, no additional text."""
         description = product_info.get('description', '').lower()
         material = product_info.get('material', '').lower()
         
-        # Basic classification rules
-        classifications = {
-            't-shirt': {'code': '6109.10.00', 'rate': '16.5%', 'desc': 'T-shirts, singlets, tank tops'},
-            'shirt': {'code': '6205.20.00', 'rate': '19.7%', 'desc': 'Men\'s or boys\' shirts'},
-            'jeans': {'code': '6203.42.40', 'rate': '16.6%', 'desc': 'Trousers of cotton'},
-            'pants': {'code': '6203.42.40', 'rate': '16.6%', 'desc': 'Trousers'},
-            'dress': {'code': '6204.42.00', 'rate': '16.0%', 'desc': 'Women\'s dresses'},
-            'shoes': {'code': '6403.99.60', 'rate': '10.0%', 'desc': 'Footwear'},
-            'laptop': {'code': '8471.30.01', 'rate': '0.0%', 'desc': 'Portable computers'},
-            'phone': {'code': '8517.12.00', 'rate': '0.0%', 'desc': 'Telephones for cellular networks'},
-            'watch': {'code': '9102.11.00', 'rate': '6.0%', 'desc': 'Wrist watches'},
-            'bag': {'code': '4202.22.00', 'rate': '17.6%', 'desc': 'Handbags'},
-        }
-        
-        # Check for matches
-        for keyword, info in classifications.items():
-            if keyword in product_name or keyword in description:
-                return {
-                    'recommended_code': info['code'],
-                    'confidence': '40%',
-                    'duty_rate': info['rate'],
-                    'reasoning': f'Fallback classification: Matched keyword "{keyword}" - {info["desc"]}',
-                    'status': 'fallback'
-                }
+        # Single scan over both fields; earlier rules win, as in the table order
+        text = f"{product_name}\n{description}"
+        hits = [_FALLBACK_RULE_INDEX[m.group(0)] for m in _FALLBACK_PATTERN.finditer(text)]
+        if hits:
+            keyword, info = _FALLBACK_RULES[min(hits)]
+            return {
+                'recommended_code': info['code'],
+                'confidence': '40%',
+                'duty_rate': info['rate'],
+                'reasoning': f'Fallback classification: Matched keyword "{keyword}" - {info["desc"]}',
+                'status': 'fallback'
+            }
         
         # Default response
         return {
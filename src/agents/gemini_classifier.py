@@ -1,8 +1,9 @@
 import google.generativeai as genai
 from config.settings import Config
+from src.utils.genai_client import configure_genai
 import json
 
-genai.configure(api_key=Config.GOOGLE_API_KEY)
+configure_genai(Config.GOOGLE_API_KEY)
 
 class GeminiClassifier:
     def __init__(self):
@@ -34,20 +35,79 @@ Return ONLY valid JSON:
 }}"""
         return prompt
     
+    def build_enhance_and_classify_prompt(self, product_info: dict, hts_candidates: list) -> str:
+        """One prompt that infers the missing product details and classifies the product"""
+        prompt = f"""You are a U.S. customs classification expert. Only a product name is known.
+First infer the typical product details, then classify the product using HTSUS rules.
+
+Product Information:
+- Name: {product_info.get('product_name', '')}
+- Origin: {product_info.get('origin', '')}
+
+Candidate HTS Codes:
+{json.dumps(hts_candidates[:3], indent=2)}
+
+Apply GRI rules and choose the most specific 10-digit HTS code.
+
+Return ONLY valid JSON:
+{{
+  "description": "Detailed product description for customs purposes",
+  "material": "Primary material composition",
+  "intended_use": "Primary intended use",
+  "recommended_code": "####.##.####",
+  "duty_rate": "X%",
+  "confidence": "NN%",
+  "reasoning": "Brief explanation applying GRI rules",
+  "alternatives": ["####.##.####", "####.##.####"]
+}}"""
+        return prompt
+    
+    def build_batch_prompt(self, items: list) -> str:
+        """Prompt classifying several products at once; items are (product_info, hts_candidates, cross_rulings)"""
+        blocks = []
+        for i, (product_info, hts_candidates, _) in enumerate(items, 1):
+            blocks.append(f"""Product {i}:
+- Name: {product_info.get('product_name', '')}
+- Description: {product_info.get('description', '')}
+- Material: {product_info.get('material', '')}
+- Use: {product_info.get('use', '')}
+- Origin: {product_info.get('origin', '')}
+Candidate HTS Codes:
+{json.dumps(hts_candidates[:3], indent=2)}""")
+        
+        products = "\n\n".join(blocks)
+        prompt = f"""You are a U.S. customs classification expert. Classify each of the following {len(items)} products using HTSUS rules.
+
+{products}
+
+Apply GRI rules and choose the most specific 10-digit HTS code for each product.
+
+Return ONLY a valid JSON array with exactly {len(items)} objects, in the same order as the products:
+[
+  {{
+    "recommended_code": "####.##.####",
+    "duty_rate": "X%",
+    "confidence": "NN%",
+    "reasoning": "Brief explanation applying GRI rules",
+    "alternatives": ["####.##.####", "####.##.####"]
+  }}
+]"""
+        return prompt
+    
+    def _parse_json(self, result_text: str):
+        """Strip optional markdown fences and parse the JSON payload"""
+        if "```json" in result_text:
+            result_text = result_text.split("```json")[1].split("```")[0]
+        elif "```" in result_text:
+            result_text = result_text.split("```")[1].split("```")[0]
+        return json.loads(result_text.strip())
+    
     def classify_product(self, product_info: dict, hts_candidates: list, cross_rulings: list) -> dict:
         prompt = self.build_classification_prompt(product_info, hts_candidates, cross_rulings)
         
         try:
             response = self.model.generate_content(prompt)
-            result_text = response.text
-            
-            # Extract JSON
-            if "```json" in result_text:
-                result_text = result_text.split("```json")[1].split("```")[0]
-            elif "```" in result_text:
-                result_text = result_text.split("```")[1].split("```")[0]
-            
-            result = json.loads(result_text.strip())
+            result = self._parse_json(response.text)
             return result
             
         except Exception as e:
@@ -58,4 +118,45 @@ Return ONLY valid JSON:
                 "confidence": "0%",
                 "reasoning": f"Classification failed: {str(e)}",
                 "alternatives": []
-            }
\ No newline at end of file
+            }
+    
+    def enhance_and_classify(self, product_info: dict, hts_candidates: list, cross_rulings: list) -> dict:
+        """
+        Infer description/material/use and classify in a single request
+        Returns None if the combined answer can't be used, so the caller can take the two-step path.
+        """
+        try:
+            response = self.model.generate_content(
+                self.build_enhance_and_classify_prompt(product_info, hts_candidates),
+                generation_config={"response_mime_type": "application/json"}
+            )
+            result = self._parse_json(response.text)
+            if isinstance(result, dict) and result.get('description') and result.get('recommended_code'):
+                return result
+            print("Gemini enhance+classify returned an incomplete answer")
+        except Exception as e:
+            print(f"Gemini enhance+classify error: {e}")
+        return None
+    
+    def classify_many(self, items: list) -> list:
+        """
+        Classify several products with one request
+        items: [(product_info, hts_candidates, cross_rulings)]; results come back in the same order.
+        Falls back to one request per product if the batched answer can't be used.
+        """
+        if len(items) == 1:
+            return [self.classify_product(*items[0])]
+        
+        try:
+            response = self.model.generate_content(
+                self.build_batch_prompt(items),
+                generation_config={"response_mime_type": "application/json"}
+            )
+            results = self._parse_json(response.text)
+            if isinstance(results, list) and len(results) == len(items) and all(isinstance(r, dict) for r in results):
+                return results
+            print(f"Gemini batch returned {len(results) if isinstance(results, list) else 'no'} results for {len(items)} products")
+        except Exception as e:
+            print(f"Gemini batch error: {e}")
+        
+        return [self.classify_product(*item) for item in items]
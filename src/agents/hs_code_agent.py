@@ -3,6 +3,7 @@ from langchain.prompts import PromptTemplate
 from langchain_google_genai import ChatGoogleGenerativeAI
 from src.tools.search_tools import SearchTools, create_langchain_tools
 from src.agents.gemini_classifier import GeminiClassifier
+from src.utils.classification_cache import SemanticClassificationCache, semantic_guard
 from config.settings import Config
 import json
 
@@ -10,6 +11,11 @@ class HSCodeAgent:
     def __init__(self):
         self.search_tools = SearchTools()
         self.gemini_classifier = GeminiClassifier()
+        # Shared by every caller of this (process-wide) agent
+        self.semantic_cache = SemanticClassificationCache(
+            threshold=Config.SEMANTIC_CACHE_THRESHOLD,
+            max_entries=Config.SEMANTIC_CACHE_SIZE
+        )
         self.llm = ChatGoogleGenerativeAI(
             model=Config.GEMINI_MODEL,
             google_api_key=Config.GOOGLE_API_KEY,
@@ -66,12 +72,14 @@ Thought:{agent_scratchpad}"""
         if not self._validate_inputs(product_info):
             return self._request_clarification(product_info)
         
-        # Step 2: Search HTS database
-        search_query = self._build_search_query(product_info)
-        hts_candidates = self.search_tools.search_hts_database(search_query, top_k=5)
+        # Near-identical products were classified before: reuse that answer
+        query_embedding = self.search_tools.embed_query(self._build_search_query(product_info))
+        cached = self._semantic_hit(query_embedding, product_info)
+        if cached is not None:
+            return cached
         
-        # Step 3: Search CROSS rulings
-        cross_rulings = self.search_tools.search_cross_rulings(search_query, top_k=3)
+        # Steps 2-3: Search HTS database and CROSS rulings
+        hts_candidates, cross_rulings = self._retrieve_context(product_info, query_embedding)
         
         # Step 4: Use Gemini to apply GRI rules and make final classification
         classification_result = self.gemini_classifier.classify_product(
@@ -80,6 +88,120 @@ Thought:{agent_scratchpad}"""
             cross_rulings
         )
         
+        result = self._finalize_result(classification_result, product_info, hts_candidates, cross_rulings)
+        self.semantic_cache.put(query_embedding, result, semantic_guard(product_info))
+        return result
+    
+    def enhance_and_classify(self, product_info: dict) -> dict:
+        """
+        Classify a product known only by name with one model call
+        The model infers description, material and use alongside the code; the
+        inferred details are returned in result['product_info']. Falls back to
+        classifying on the name alone if the combined answer is unusable.
+        """
+        if not product_info.get('product_name'):
+            return self._request_clarification(product_info)
+        
+        query_embedding = self.search_tools.embed_query(self._build_search_query(product_info))
+        # Name-only answers are kept apart from ones classified on full details
+        guard = ('name-only',) + semantic_guard(product_info)
+        hit = self.semantic_cache.get(query_embedding, guard)
+        if hit is not None:
+            cached = self._mark_borrowed(*hit)
+            # Keep the details inferred for the cached product where the user gave none
+            inferred = cached.get('product_info') or {}
+            cached['product_info'] = {**inferred, **{k: v for k, v in product_info.items() if v}}
+            return cached
+        
+        hts_candidates, cross_rulings = self._retrieve_context(product_info, query_embedding)
+        
+        classification_result = self.gemini_classifier.enhance_and_classify(
+            product_info,
+            hts_candidates,
+            cross_rulings
+        )
+        if classification_result is None:
+            classification_result = self.gemini_classifier.classify_product(
+                product_info,
+                hts_candidates,
+                cross_rulings
+            )
+        else:
+            inferred = {
+                'description': classification_result.pop('description', ''),
+                'material': classification_result.pop('material', ''),
+                'use': classification_result.pop('intended_use', ''),
+            }
+            product_info = {**product_info, **{k: v for k, v in inferred.items() if not product_info.get(k)}}
+        
+        result = self._finalize_result(classification_result, product_info, hts_candidates, cross_rulings)
+        self.semantic_cache.put(query_embedding, result, guard)
+        return result
+    
+    def classify_many(self, products: list, batch_size: int = 16) -> list:
+        """
+        Classify several products, packing up to batch_size of them into each Gemini request
+        Returns results in the same order as products
+        """
+        results = [None] * len(products)
+        pending = []  # (position, product_info, hts_candidates, cross_rulings)
+        embeddings = {}
+        
+        for pos, product_info in enumerate(products):
+            if not self._validate_inputs(product_info):
+                results[pos] = self._request_clarification(product_info)
+                continue
+            query_embedding = self.search_tools.embed_query(self._build_search_query(product_info))
+            cached = self._semantic_hit(query_embedding, product_info)
+            if cached is not None:
+                results[pos] = cached
+                continue
+            embeddings[pos] = query_embedding
+            pending.append((pos, product_info) + self._retrieve_context(product_info, query_embedding))
+        
+        for start in range(0, len(pending), batch_size):
+            chunk = pending[start:start + batch_size]
+            classifications = self.gemini_classifier.classify_many(
+                [(product_info, hts_candidates, cross_rulings)
+                 for _, product_info, hts_candidates, cross_rulings in chunk]
+            )
+            for (pos, product_info, hts_candidates, cross_rulings), classification_result in zip(chunk, classifications):
+                results[pos] = self._finalize_result(classification_result, product_info, hts_candidates, cross_rulings)
+                self.semantic_cache.put(embeddings[pos], results[pos], semantic_guard(product_info))
+        
+        return results
+    
+    def _retrieve_context(self, product_info: dict, query_embedding=None) -> tuple:
+        """Vector search for HTS candidates and CROSS rulings (one query embedding for both)"""
+        search_query = self._build_search_query(product_info)
+        if query_embedding is None:
+            query_embedding = self.search_tools.embed_query(search_query)
+        hts_candidates = self.search_tools.search_hts_database(search_query, top_k=5, query_embedding=query_embedding)
+        cross_rulings = self.search_tools.search_cross_rulings(search_query, top_k=3, query_embedding=query_embedding)
+        return hts_candidates, cross_rulings
+    
+    def _semantic_hit(self, query_embedding, product_info: dict):
+        """Cached result for a near-identical earlier query, re-labelled for this product"""
+        hit = self.semantic_cache.get(query_embedding, semantic_guard(product_info))
+        if hit is None:
+            return None
+        cached = self._mark_borrowed(*hit)
+        cached['product_info'] = product_info
+        return cached
+    
+    def _mark_borrowed(self, result: dict, similarity: float) -> dict:
+        """
+        Flag a result taken from a similar (not identical) product: its code,
+        reasoning and candidates describe that product, so it always needs review
+        """
+        result['source'] = 'semantic_cache'
+        result['semantic_similarity'] = round(similarity, 4)
+        result['needs_review'] = True
+        return result
+    
+    def _finalize_result(self, classification_result: dict, product_info: dict,
+                         hts_candidates: list, cross_rulings: list) -> dict:
+        """Duty lookup, metadata and review flag for a Gemini classification"""
         # Step 5: Enhance with duty rate lookup
         if classification_result.get('recommended_code'):
             duty_info = self.search_tools.lookup_duty_rate(
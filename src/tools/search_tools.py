@@ -2,18 +2,94 @@ from langchain.tools import Tool
 from pinecone import Pinecone
 from sentence_transformers import SentenceTransformer
 from config.settings import Config
-from typing import List, Dict
+from typing import List, Dict, Optional, Sequence
+import json
+import os
+import re
+
+try:
+    import pyarrow as pa
+except ModuleNotFoundError:
+    pa = None
+
+_NON_DIGIT = re.compile(r"\D")
+
+def _build_duty_index(hs_codes, duty_rates, descriptions) -> Dict[str, Dict]:
+    """
+    Map HTS codes (digits only) to their duty rate and description.
+    Shorter prefixes (4/6/8 digits) are included only when every code under
+    them carries the same rate, so a prefix hit is never ambiguous.
+    """
+    index = {}
+    prefix_rates = {}
+    for hs_code, duty_rate, description in zip(hs_codes, duty_rates, descriptions):
+        code = _NON_DIGIT.sub("", str(hs_code or ""))
+        if not code:
+            continue
+        entry = {'duty_rate': duty_rate or '', 'description': description or ''}
+        index[code] = entry
+        for length in (4, 6, 8):
+            if length < len(code):
+                prefix_rates.setdefault(code[:length], set()).add(entry['duty_rate'])
+    
+    for prefix, rates in prefix_rates.items():
+        if prefix not in index and len(rates) == 1:
+            index[prefix] = {'duty_rate': next(iter(rates)), 'description': ''}
+    return index
 
 class SearchTools:
-    def __init__(self):
+    def __init__(self, htsus_file: str = 'data/htsus/htsus_complete.json',
+                 reference_file: str = 'data/processed/htsus_reference.arrow'):
         self.pc = Pinecone(api_key=Config.PINECONE_API_KEY)
         self.index = self.pc.Index(Config.INDEX_NAME)
         self.model = SentenceTransformer(Config.EMBEDDING_MODEL)
+        self.duty_index = self._load_duty_index(htsus_file, reference_file)
     
-    def search_hts_database(self, query: str, top_k: int = 5) -> List[Dict]:
+    def _load_duty_index(self, htsus_file: str, reference_file: str) -> Dict[str, Dict]:
+        """
+        Build the in-memory duty table. Prefers the Arrow reference written by
+        DataProcessor (memory-mapped, only the needed columns are read) and
+        falls back to the raw HTSUS JSON export.
+        """
+        if pa is not None and os.path.exists(reference_file):
+            try:
+                with pa.memory_map(reference_file) as source:
+                    table = pa.ipc.open_file(source).read_all()
+                return _build_duty_index(
+                    table.column('hs_code').to_pylist(),
+                    table.column('duty_rate').to_pylist(),
+                    table.column('description').to_pylist()
+                )
+            except (OSError, KeyError, pa.ArrowInvalid):
+                pass
+        
+        if not os.path.exists(htsus_file):
+            return {}
+        try:
+            with open(htsus_file, 'r') as f:
+                records = json.load(f)
+            return _build_duty_index(
+                [r.get('hs_code') for r in records],
+                [r.get('duty_rate') for r in records],
+                [r.get('description') for r in records]
+            )
+        except (OSError, ValueError):
+            return {}
+    
+    def _lookup_local_duty_rate(self, hs_code: str) -> Optional[Dict]:
+        """O(1) lookup of a full code, or of a shorter heading whose codes all share one rate"""
+        return self.duty_index.get(_NON_DIGIT.sub("", str(hs_code)))
+    
+    def embed_query(self, query: str) -> List[float]:
+        """Embedding of a search query, shareable across the searches below"""
+        return self.model.encode(query).tolist()
+    
+    def search_hts_database(self, query: str, top_k: int = 5,
+                            query_embedding: Optional[Sequence[float]] = None) -> List[Dict]:
         """Search HTSUS database"""
         # Create query embedding
-        query_embedding = self.model.encode(query).tolist()
+        if query_embedding is None:
+            query_embedding = self.embed_query(query)
         
         # Search Pinecone
         results = self.index.query(
@@ -35,9 +111,11 @@ class SearchTools:
         
         return candidates
     
-    def search_cross_rulings(self, query: str, top_k: int = 3) -> List[Dict]:
+    def search_cross_rulings(self, query: str, top_k: int = 3,
+                             query_embedding: Optional[Sequence[float]] = None) -> List[Dict]:
         """Search CROSS rulings"""
-        query_embedding = self.model.encode(query).tolist()
+        if query_embedding is None:
+            query_embedding = self.embed_query(query)
         
         results = self.index.query(
             vector=query_embedding,
@@ -62,7 +140,11 @@ class SearchTools:
     
     def lookup_duty_rate(self, hs_code: str) -> Dict:
         """Look up duty rate for specific HS code"""
-        # Search for exact HS code
+        local = self._lookup_local_duty_rate(hs_code)
+        if local:
+            return dict(local)
+        
+        # Not in the local table - search the index for the exact HS code
         results = self.index.query(
             vector=[0.0] * Config.DIMENSION,  # Dummy vector
             top_k=1,
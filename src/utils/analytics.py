@@ -1,9 +1,20 @@
+import numpy as np
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime, timedelta
 from collections import Counter
 
+# Confidence bin edges (as fractions) and labels for accuracy-by-confidence
+CONFIDENCE_BIN_EDGES = np.array([0.5, 0.7, 0.85])
+CONFIDENCE_BIN_LABELS = ['Low (<50%)', 'Medium (50-70%)', 'High (70-85%)', 'Very High (>85%)']
+
+def confidence_fraction(series: pd.Series) -> np.ndarray:
+    """Parse confidence values ('85%', 85 or 0.85) into a float array in [0, 1]; unparseable -> NaN"""
+    values = pd.to_numeric(series.astype(str).str.strip().str.rstrip('%'), errors='coerce').to_numpy(dtype=np.float64)
+    values = np.where(values > 1.0, values * 0.01, values)
+    return np.clip(values, 0.0, 1.0)
+
 class AnalyticsEngine:
     def __init__(self, feedback_manager):
         self.feedback_manager = feedback_manager
@@ -22,21 +33,28 @@ class AnalyticsEngine:
         return {
             'total_classifications': len(self.df),
             'accuracy_rate': (self.df['was_correct'].sum() / len(self.df) * 100) if len(self.df) > 0 else 0,
-            'avg_confidence': self.df['confidence'].mean() * 100 if 'confidence' in self.df.columns else 0,
+            'avg_confidence': self._avg_confidence_pct(),
             'total_feedback': len(self.df)
         }
     
+    def _avg_confidence_pct(self):
+        if 'confidence' not in self.df.columns:
+            return 0
+        conf = confidence_fraction(self.df['confidence'])
+        valid = conf[~np.isnan(conf)]
+        return float(valid.mean() * 100) if valid.size else 0
+    
     def get_confidence_distribution(self):
         """Plot confidence score distribution"""
         if self.df.empty or 'confidence' not in self.df.columns:
             return None
         
+        conf = confidence_fraction(self.df['confidence'])
         fig = px.histogram(
-            self.df,
-            x='confidence',
+            x=conf[~np.isnan(conf)] * 100,
             nbins=20,
             title='Confidence Score Distribution',
-            labels={'confidence': 'Confidence Score', 'count': 'Number of Classifications'},
+            labels={'x': 'Confidence Score', 'count': 'Number of Classifications'},
             color_discrete_sequence=['#1f77b4']
         )
         
@@ -53,16 +71,23 @@ class AnalyticsEngine:
         if self.df.empty:
             return None
         
-        # Bin confidence scores
-        self.df['confidence_bin'] = pd.cut(self.df['confidence'], bins=[0, 0.5, 0.7, 0.85, 1.0], 
-                                           labels=['Low (<50%)', 'Medium (50-70%)', 'High (70-85%)', 'Very High (>85%)'])
+        if 'confidence' not in self.df.columns:
+            return None
         
-        accuracy_by_conf = self.df.groupby('confidence_bin')['was_correct'].mean() * 100
+        # Bin confidence scores and count hits per bin in one pass
+        conf = confidence_fraction(self.df['confidence'])
+        correct = self.df['was_correct'].fillna(False).astype(bool).to_numpy()
+        valid = ~np.isnan(conf)
+        bins = np.digitize(conf[valid], CONFIDENCE_BIN_EDGES, right=True)
+        n_bins = len(CONFIDENCE_BIN_LABELS)
+        counts = np.bincount(bins, minlength=n_bins)
+        hits = np.bincount(bins, weights=correct[valid], minlength=n_bins)
+        accuracy_by_conf = np.divide(hits * 100.0, counts, out=np.full(n_bins, np.nan), where=counts > 0)
         
         fig = go.Figure(data=[
             go.Bar(
-                x=accuracy_by_conf.index.astype(str),
-                y=accuracy_by_conf.values,
+                x=CONFIDENCE_BIN_LABELS,
+                y=accuracy_by_conf,
                 marker_color=['#d62728', '#ff7f0e', '#2ca02c', '#1f77b4']
             )
         ])
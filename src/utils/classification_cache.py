@@ -0,0 +1,132 @@
+import copy
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from src.utils import json_io
+
+PRODUCT_FIELDS = ('product_name', 'description', 'material', 'use', 'origin')
+# Fields that must match exactly before a semantic hit is accepted: the code
+# often turns on them (cotton vs. polyester knit shirts: 6109.10 vs. 6109.90)
+SEMANTIC_GUARD_FIELDS = ('material', 'use')
+
+
+def _normalize_field(value) -> str:
+    return " ".join(str(value or '').split()).lower()
+
+
+def product_key(product_info: Dict) -> str:
+    """Canonical content hash of the fields that drive a classification"""
+    canonical = {field: _normalize_field(product_info.get(field)) for field in PRODUCT_FIELDS}
+    return hashlib.blake2b(json_io.dumps(canonical).encode('utf-8'), digest_size=16).hexdigest()
+
+
+def semantic_guard(product_info: Dict) -> tuple:
+    """Normalized SEMANTIC_GUARD_FIELDS; semantic hits require an equal guard"""
+    return tuple(_normalize_field(product_info.get(field)) for field in SEMANTIC_GUARD_FIELDS)
+
+
+def is_cacheable(result: Optional[Dict]) -> bool:
+    """Only keep results that carry a usable code"""
+    if not result:
+        return False
+    code = str(result.get('recommended_code', '')).strip().upper()
+    return code not in ('', 'N/A', 'ERROR')
+
+
+class ClassificationCache:
+    """Thread-safe LRU of classification results keyed by product_key()"""
+
+    def __init__(self, max_entries: int = 1000):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Dict]:
+        with self._lock:
+            result = self._entries.get(key)
+            if result is None:
+                return None
+            self._entries.move_to_end(key)
+        return copy.deepcopy(result)
+
+    def put(self, key: str, result: Dict) -> None:
+        if not is_cacheable(result):
+            return
+        with self._lock:
+            self._entries[key] = copy.deepcopy(result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SemanticClassificationCache:
+    """Thread-safe LRU of results keyed by query embedding.
+
+    A lookup returns the stored result whose embedding has the highest cosine
+    similarity with the query, provided it reaches the threshold and was stored
+    under the same guard (see semantic_guard), so reworded descriptions of the
+    same product skip retrieval and the model call but a different material or
+    use never borrows another product's code.
+    """
+
+    def __init__(self, threshold: float = 0.95, max_entries: int = 512):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self._vectors: Optional[np.ndarray] = None  # one unit vector per slot
+        self._results: Dict[int, Dict] = {}
+        self._guards: Dict[int, tuple] = {}
+        self._lru: "OrderedDict[int, None]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32).ravel()
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def get(self, embedding, guard: tuple = ()) -> Optional[Tuple[Dict, float]]:
+        """(copy of the best stored result, its cosine similarity), or None"""
+        if self.threshold > 1.0:
+            return None
+        query = self._normalize(embedding)
+        with self._lock:
+            slots = [slot for slot in self._lru if self._guards[slot] == guard]
+            if not slots:
+                return None
+            slots = np.asarray(slots, dtype=np.intp)
+            scores = self._vectors[slots] @ query
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                return None
+            score = float(scores[best])
+            slot = int(slots[best])
+            self._lru.move_to_end(slot)
+            result = self._results[slot]
+        return copy.deepcopy(result), score
+
+    def put(self, embedding, result: Dict, guard: tuple = ()) -> None:
+        if self.threshold > 1.0 or not is_cacheable(result):
+            return
+        vector = self._normalize(embedding)
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_entries, vector.shape[0]), dtype=np.float32)
+            if len(self._lru) < self.max_entries:
+                slot = len(self._lru)
+            else:
+                # Reuse the least recently used slot
+                slot, _ = self._lru.popitem(last=False)
+            self._vectors[slot] = vector
+            self._results[slot] = copy.deepcopy(result)
+            self._guards[slot] = guard
+            self._lru[slot] = None
+
+    def __len__(self) -> int:
+        return len(self._lru)
@@ -50,6 +50,16 @@ class DataProcessor:
         
         return df
     
+    def save_htsus_reference(self, htsus_df, file_path='data/processed/htsus_reference.arrow'):
+        """Write the code/rate/description columns as an Arrow IPC file for memory-mapped lookups"""
+        import pyarrow as pa
+        
+        columns = ['hs_code', 'description', 'duty_rate', 'chapter']
+        table = pa.Table.from_pandas(htsus_df[columns].astype(str), preserve_index=False)
+        with pa.OSFile(file_path, 'wb') as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+    
     def create_embeddings(self, texts, batch_size=32):
         """Generate embeddings for texts"""
         embeddings = []
@@ -86,6 +96,7 @@ class DataProcessor:
         print("Saving processed data...")
         htsus_df.to_pickle('data/processed/htsus_with_embeddings.pkl')
         cross_df.to_pickle('data/processed/cross_with_embeddings.pkl')
+        self.save_htsus_reference(htsus_df)
         
         print(f"✅ Processed {len(htsus_df)} HTSUS entries and {len(cross_df)} CROSS rulings")
         print(f"✅ Files saved to data/processed/")
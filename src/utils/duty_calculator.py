@@ -1,6 +1,9 @@
+from collections import deque
 from datetime import datetime
 from typing import Dict, Optional
 
+import numpy as np
+
 class DutyCalculator:
     """Calculate import duties and fees for products"""
     
@@ -11,8 +14,14 @@ class DutyCalculator:
     
     HMF_RATE = 0.00125   # Harbor Maintenance Fee: 0.125% (for sea shipments)
     
+    # Display strings for the fixed fee rates, formatted once
+    MPF_RATE_LABEL = f"{MPF_RATE * 100:.4f}%"
+    HMF_RATE_LABEL = f"{HMF_RATE * 100:.3f}%"
+    
+    HISTORY_SIZE = 100   # Most recent calculations kept per calculator
+    
     def __init__(self):
-        self.calculation_history = []
+        self.calculation_history = deque(maxlen=self.HISTORY_SIZE)
     
     def parse_duty_rate(self, duty_rate_str: str) -> float:
         """
@@ -96,6 +105,54 @@ class DutyCalculator:
         self.calculation_history.append(result)
         return result
     
+    def calculate_duties_array(self,
+                               customs_values,
+                               duty_rates,
+                               shipping_method: str = "sea",
+                               include_mpf: bool = True,
+                               include_hmf: bool = True) -> Dict[str, np.ndarray]:
+        """
+        Vectorized form of calculate_duties for many shipments at once
+        
+        Args:
+            customs_values: Array-like of declared values (CIF)
+            duty_rates: Array-like of decimal duty rates (see parse_duty_rate)
+            shipping_method: "sea" or "air"
+            include_mpf: Include Merchandise Processing Fee
+            include_hmf: Include Harbor Maintenance Fee (sea only)
+        
+        Returns:
+            Dictionary of float64 arrays, one entry per charge. Rows with a
+            non-positive customs value come back as all zeros.
+        """
+        values = np.asarray(customs_values, dtype=np.float64)
+        rates = np.asarray(duty_rates, dtype=np.float64)
+        zeros = np.zeros_like(values)
+        dutiable = values > 0
+        
+        base_duty = np.where(dutiable, values * rates, 0.0)
+        
+        mpf = zeros
+        if include_mpf:
+            mpf = np.where(dutiable, np.clip(values * self.MPF_RATE, self.MPF_MIN, self.MPF_MAX), 0.0)
+        
+        hmf = zeros
+        if include_hmf and shipping_method.lower() == "sea":
+            hmf = np.where(dutiable, values * self.HMF_RATE, 0.0)
+        
+        total_duties = base_duty + mpf + hmf
+        effective_rate = np.divide(total_duties * 100.0, values, out=np.zeros_like(values), where=dutiable)
+        
+        return {
+            'customs_value': np.where(dutiable, values, 0.0),
+            'base_duty': base_duty,
+            'mpf': mpf,
+            'hmf': hmf,
+            'total_duties_and_fees': total_duties,
+            'total_landed_cost': np.where(dutiable, values + total_duties, 0.0),
+            'effective_duty_rate': effective_rate
+        }
+    
     def calculate_from_invoice(self,
                                fob_value: float,
                                freight_cost: float,
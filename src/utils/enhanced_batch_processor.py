@@ -1,21 +1,107 @@
 import pandas as pd
 import streamlit as st
 from datetime import datetime
-import time
 import json
 from typing import List, Dict, Any, Optional, Tuple
 import io
 import numpy as np
 import re
+import importlib.util
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+except ModuleNotFoundError:
+    pa = None
+    pa_csv = None
+
+from config.settings import Config
+from src.utils.classification_cache import ClassificationCache, product_key
+
+# Types for the columns the upload template defines. Uploads that follow the
+# template parse straight into these instead of being type-inferred; money
+# stays float64 so cents survive on large invoices.
+TEMPLATE_DTYPES = {
+    'product_name': 'string',
+    'description': 'string',
+    'material': 'string',
+    'intended_use': 'string',
+    'origin': 'string',
+    'quantity': 'Int64',
+    'unit_value': 'float64',
+    'customs_value': 'float64',
+}
+
+if pa is not None:
+    _ARROW_TEMPLATE_TYPES = {
+        col: pa.string() if dtype == 'string' else pa.int64() if dtype == 'Int64' else pa.float64()
+        for col, dtype in TEMPLATE_DTYPES.items()
+    }
+
+# Rust-based Excel reader, used by pandas when python-calamine is installed
+_EXCEL_ENGINE = "calamine" if importlib.util.find_spec("python_calamine") else None
 
 class EnhancedBatchProcessor:
     """Ultra-flexible batch processing that handles any file format and ALL rows"""
     
-    def __init__(self, hs_agent, fallback_analyzer=None, duty_calculator=None):
+    def __init__(self, hs_agent, fallback_analyzer=None, duty_calculator=None,
+                 max_concurrency: Optional[int] = None, prompt_batch_size: Optional[int] = None,
+                 cache: Optional[ClassificationCache] = None):
         self.hs_agent = hs_agent
         self.fallback = fallback_analyzer
         self.duty_calculator = duty_calculator
+        self.max_concurrency = max_concurrency or Config.BATCH_MAX_CONCURRENCY
+        self.prompt_batch_size = prompt_batch_size or Config.BATCH_PROMPT_SIZE
+        self.cache = cache if cache is not None else ClassificationCache()
+    
+    def for_run(self, fallback_analyzer=None, max_concurrency: Optional[int] = None) -> "EnhancedBatchProcessor":
+        """
+        Processor with this run's settings; it shares the agent, calculator and
+        classification cache, so later runs can't change a job already in flight
+        """
+        return EnhancedBatchProcessor(
+            self.hs_agent,
+            fallback_analyzer,
+            self.duty_calculator,
+            max_concurrency=max_concurrency or self.max_concurrency,
+            prompt_batch_size=self.prompt_batch_size,
+            cache=self.cache
+        )
+        
+    def read_uploaded_file(self, file_name: str, data: bytes) -> pd.DataFrame:
+        """
+        Read an uploaded CSV/Excel file into a DataFrame
+        CSV goes through pyarrow's multithreaded parser when available
+        """
+        if file_name.lower().endswith('.csv'):
+            if pa_csv is not None:
+                try:
+                    table = pa_csv.read_csv(
+                        pa.BufferReader(data),
+                        read_options=pa_csv.ReadOptions(block_size=1 << 20, use_threads=True),
+                        convert_options=pa_csv.ConvertOptions(column_types=_ARROW_TEMPLATE_TYPES)
+                    )
+                    return table.to_pandas()
+                except pa.ArrowInvalid:
+                    # Ragged rows, odd encodings, "$1,200" in a value column etc. - let pandas have a go
+                    pass
+            return pd.read_csv(io.BytesIO(data))
         
+        return self._apply_template_dtypes(pd.read_excel(io.BytesIO(data), engine=_EXCEL_ENGINE))
+    
+    @staticmethod
+    def _apply_template_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+        """Cast numeric template columns that are present; leave any that don't convert cleanly"""
+        # Text columns stay as read so blanks remain NaN rather than pd.NA
+        for col, dtype in TEMPLATE_DTYPES.items():
+            if col in df.columns and dtype != 'string':
+                try:
+                    df[col] = df[col].astype(dtype)
+                except (TypeError, ValueError):
+                    pass
+        return df
+    
     def detect_and_map_columns(self, df: pd.DataFrame) -> Tuple[pd.DataFrame, Dict[str, str]]:
         """
         Intelligently detect and map columns to standard names
@@ -231,89 +317,195 @@ class EnhancedBatchProcessor:
                                   shipping_method: str = "sea",
                                   include_mpf: bool = True,
                                   include_hmf: bool = True,
-                                  progress_callback=None) -> pd.DataFrame:
+                                  progress_callback=None,
+                                  notify: bool = True) -> pd.DataFrame:
         """
         Process ALL products in the dataframe - no limits!
+        Pass notify=False when running off the script thread (background jobs),
+        where Streamlit calls have no script context.
         """
         # Ensure columns are standardized
         standardized_df, _ = self.detect_and_map_columns(df)
         
-        results = []
         total = len(standardized_df)
         
-        st.info(f"🚀 Processing ALL {total} products... This will classify everything in your file!")
+        if notify:
+            st.info(f"🚀 Processing ALL {total} products... This will classify everything in your file!")
+        
+        rows = standardized_df.to_dict('records')
+        product_infos = [self._build_product_info(row, pos) for pos, row in enumerate(rows)]
+        
+        outcomes = self._classify_with_cache(product_infos, progress_callback)
+        
+        # Output columns are preallocated and filled by row position
+        hs_codes = np.empty(total, dtype=object)
+        confidences = np.empty(total, dtype=object)
+        duty_rates = np.empty(total, dtype=object)
+        reasonings = np.empty(total, dtype=object)
+        statuses = np.empty(total, dtype=object)
+        processed_at = np.empty(total, dtype=object)
+        succeeded = np.zeros(total, dtype=bool)
+        
+        for pos, (classification, finished_at) in enumerate(outcomes):
+            processed_at[pos] = finished_at
+            if isinstance(classification, Exception):
+                hs_codes[pos] = 'ERROR'
+                confidences[pos] = '0%'
+                duty_rates[pos] = 'N/A'
+                reasonings[pos] = f'Classification error: {str(classification)}'
+                statuses[pos] = 'Failed'
+            else:
+                reasoning = classification.get('reasoning', '')
+                hs_codes[pos] = classification.get('recommended_code', 'N/A')
+                confidences[pos] = classification.get('confidence', '0%')
+                duty_rates[pos] = classification.get('duty_rate', 'N/A')
+                reasonings[pos] = (reasoning[:200] + '...') if len(reasoning) > 200 else reasoning
+                statuses[pos] = 'Success'
+                succeeded[pos] = True
+        
+        results = standardized_df.reset_index(drop=True)
+        results['hs_code'] = hs_codes
+        results['confidence'] = confidences
+        results['duty_rate'] = duty_rates
+        results['reasoning'] = reasonings
+        results['classification_status'] = statuses
+        results['processed_at'] = processed_at
+        
+        # Duties for all successfully classified rows are computed in one vectorized pass
+        if calculate_duties and self.duty_calculator and succeeded.any():
+            positions = np.flatnonzero(succeeded)
+            self._apply_duties(
+                results,
+                positions,
+                np.array([self._resolve_customs_value(rows[pos]) for pos in positions], dtype=np.float64),
+                duty_rates[positions],
+                shipping_method, include_mpf, include_hmf
+            )
+        
+        return results
+    
+    def _build_product_info(self, row: Dict, pos: int) -> Dict[str, str]:
+        """Prepare product info with all available data"""
+        return {
+            'product_name': str(row.get('product_name', '')).strip() or f'Product_{pos+1}',
+            'description': str(row.get('description', '')).strip() or str(row.get('product_name', '')),
+            'material': str(row.get('material', '')).strip(),
+            'use': str(row.get('intended_use', row.get('use', ''))).strip(),
+            'origin': str(row.get('origin', row.get('country_of_origin', ''))).strip()
+        }
+    
+    def _cache_key(self, product_info: Dict) -> str:
+        # Fallback changes the stored answer, so runs with and without it don't share entries
+        return product_key(product_info) + (':fallback' if self.fallback else '')
+    
+    def count_unique_products(self, df: pd.DataFrame) -> int:
+        """Number of distinct products (by normalized name/description/material/use/origin) in a file"""
+        standardized_df, _ = self.detect_and_map_columns(df)
+        rows = standardized_df.to_dict('records')
+        return len({product_key(self._build_product_info(row, pos)) for pos, row in enumerate(rows)})
+    
+    def _classify_with_cache(self, product_infos: List[Dict], progress_callback=None) -> List[Tuple[Any, str]]:
+        """
+        Serve repeats from the cache, classify each remaining distinct product once
+        (concurrently) and broadcast its result to every row that shares it
+        """
+        total = len(product_infos)
+        keys = [self._cache_key(info) for info in product_infos]
+        outcomes = [None] * total
+        pending = {}  # key -> row positions waiting on it, in first-seen order
+        
+        served_at = datetime.now().isoformat()
+        for pos, key in enumerate(keys):
+            if key in pending:
+                pending[key].append(pos)
+                continue
+            cached = self.cache.get(key)
+            if cached is not None:
+                outcomes[pos] = (cached, served_at)
+            else:
+                pending[key] = [pos]
+        
+        hits = total - sum(len(positions) for positions in pending.values())
+        steps = hits + len(pending)  # progress counts cached rows plus distinct products to classify
+        if progress_callback and hits:
+            progress_callback(hits, steps, f"{hits} cached")
         
-        for idx, row in standardized_df.iterrows():
-            # Update progress
-            if progress_callback:
-                product_display = str(row.get('product_name', f'Row {idx+1}'))[:50]
-                progress_callback(idx + 1, total, product_display)
+        if pending:
+            def report(done, _, name):
+                if progress_callback:
+                    progress_callback(hits + done, steps, name)
             
-            # Prepare product info with all available data
-            product_info = {
-                'product_name': str(row.get('product_name', '')).strip() or f'Product_{idx+1}',
-                'description': str(row.get('description', '')).strip() or str(row.get('product_name', '')),
-                'material': str(row.get('material', '')).strip(),
-                'use': str(row.get('intended_use', row.get('use', ''))).strip(),
-                'origin': str(row.get('origin', row.get('country_of_origin', ''))).strip()
+            # Classify one row per distinct product; outcomes come back in input order
+            fresh = self._classify_all([product_infos[positions[0]] for positions in pending.values()], report)
+            for (key, positions), (classification, processed_at) in zip(pending.items(), fresh):
+                for pos in positions:
+                    outcomes[pos] = (classification, processed_at)
+                if not isinstance(classification, Exception):
+                    self.cache.put(key, classification)
+        
+        return outcomes
+    
+    def _apply_fallback(self, product_info: Dict, classification: Dict) -> Dict:
+        """Retry through the LLM fallback on low confidence"""
+        confidence = self._parse_confidence(classification.get('confidence', 0))
+        if self.fallback and confidence < 50:
+            classification = self.fallback.analyze_unknown_product(product_info)
+        return classification
+    
+    def _classify_chunk(self, product_infos: List[Dict]) -> List[Any]:
+        """
+        Classify a chunk with one multi-product prompt, falling back per product if the chunk fails
+        Returns a classification dict or the exception raised, per product
+        """
+        try:
+            classifications = self.hs_agent.classify_many(product_infos, self.prompt_batch_size)
+        except Exception:
+            classifications = []
+            for product_info in product_infos:
+                try:
+                    classifications.append(self.hs_agent.classify_product(product_info))
+                except Exception as e:
+                    classifications.append(e)
+        
+        results = []
+        for product_info, classification in zip(product_infos, classifications):
+            if not isinstance(classification, Exception):
+                try:
+                    classification = self._apply_fallback(product_info, classification)
+                except Exception as e:
+                    classification = e
+            results.append(classification)
+        return results
+    
+    def _classify_all(self, product_infos: List[Dict], progress_callback=None) -> List[Tuple[Any, str]]:
+        """
+        Classify in prompt-sized chunks on a pool of max_concurrency worker threads
+        Returns: [(classification or exception, processed_at)] in input order
+        """
+        total = len(product_infos)
+        chunks = [list(range(start, min(start + self.prompt_batch_size, total)))
+                  for start in range(0, total, self.prompt_batch_size)]
+        outcomes = [None] * total
+        done = 0
+        
+        workers = max(1, min(self.max_concurrency, len(chunks)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="batch-classify") as executor:
+            futures = {
+                executor.submit(self._classify_chunk, [product_infos[pos] for pos in positions]): positions
+                for positions in chunks
             }
             
-            # Initialize result with all original data
-            row_result = row.to_dict()
-            
-            try:
-                # Classify product
-                classification = self.hs_agent.classify_product(product_info)
-                
-                # Check if fallback needed
-                confidence = self._parse_confidence(classification.get('confidence', 0))
-                if self.fallback and confidence < 50:
-                    classification = self.fallback.analyze_unknown_product(product_info)
-                
-                # Update result with classification
-                row_result.update({
-                    'hs_code': classification.get('recommended_code', 'N/A'),
-                    'confidence': classification.get('confidence', '0%'),
-                    'duty_rate': classification.get('duty_rate', 'N/A'),
-                    'reasoning': (classification.get('reasoning', '')[:200] + '...') if len(classification.get('reasoning', '')) > 200 else classification.get('reasoning', ''),
-                    'classification_status': 'Success'
-                })
-                
-                # Calculate duties if requested and data available
-                if calculate_duties and self.duty_calculator:
-                    try:
-                        duty_result = self._calculate_duties_for_row(
-                            pd.Series(row_result),
-                            classification.get('duty_rate', '0%'),
-                            shipping_method,
-                            include_mpf,
-                            include_hmf
-                        )
-                        row_result.update(duty_result)
-                    except Exception as e:
-                        row_result['duty_calc_error'] = str(e)
-                
-            except Exception as e:
-                row_result.update({
-                    'hs_code': 'ERROR',
-                    'confidence': '0%',
-                    'duty_rate': 'N/A',
-                    'reasoning': f'Classification error: {str(e)}',
-                    'classification_status': 'Failed'
-                })
-            
-            row_result['processed_at'] = datetime.now().isoformat()
-            results.append(row_result)
-            
-            # Adaptive delay - shorter for larger batches
-            if total < 20:
-                time.sleep(0.5)
-            elif total < 50:
-                time.sleep(0.3)
-            else:
-                time.sleep(0.2)  # Faster for large batches
-        
-        return pd.DataFrame(results)
+            # Progress is reported from the calling thread as chunks finish
+            for future in as_completed(futures):
+                positions = futures[future]
+                finished_at = datetime.now().isoformat()
+                for pos, classification in zip(positions, future.result()):
+                    outcomes[pos] = (classification, finished_at)
+                    done += 1
+                    if progress_callback:
+                        progress_callback(done, total, product_infos[pos]['product_name'][:50])
+        
+        return outcomes
     
     def _parse_confidence(self, conf_value) -> float:
         """Parse confidence value to float"""
@@ -326,79 +518,71 @@ class EnhancedBatchProcessor:
         except:
             return 0.0
     
-    def _calculate_duties_for_row(self, row: pd.Series, duty_rate: str, 
-                                  shipping_method: str, include_mpf: bool, 
-                                  include_hmf: bool) -> Dict:
-        """Calculate duties for a single row with flexible value detection"""
-        try:
-            customs_value = 0
-            
-            # Try multiple ways to determine customs value
-            if 'customs_value' in row and pd.notna(row['customs_value']):
-                try:
-                    customs_value = float(row['customs_value'])
-                except:
-                    pass
-            
-            if customs_value == 0 and 'quantity' in row and 'unit_value' in row:
-                try:
-                    quantity = float(row.get('quantity', 1)) if pd.notna(row.get('quantity')) else 1
-                    unit_value = float(row.get('unit_value', 0)) if pd.notna(row.get('unit_value')) else 0
-                    customs_value = quantity * unit_value
-                except:
-                    pass
-            
-            if customs_value == 0:
-                # Try to find any column with 'total' or 'value' in it
-                for col in row.index:
-                    if ('total' in col.lower() or 'value' in col.lower()) and pd.notna(row[col]):
-                        try:
-                            customs_value = float(row[col])
-                            if customs_value > 0:
-                                break
-                        except:
-                            continue
-            
-            if customs_value > 0:
-                duty_calc = self.duty_calculator.calculate_duties(
-                    customs_value=customs_value,
-                    duty_rate=duty_rate,
-                    shipping_method=shipping_method,
-                    include_mpf=include_mpf,
-                    include_hmf=include_hmf
-                )
-                
-                return {
-                    'customs_value': customs_value,
-                    'base_duty': duty_calc['base_duty'],
-                    'mpf': duty_calc['mpf'],
-                    'hmf': duty_calc['hmf'],
-                    'total_duties': duty_calc['total_duties_and_fees'],
-                    'total_landed_cost': duty_calc['total_landed_cost'],
-                    'effective_duty_rate': f"{duty_calc['effective_duty_rate']:.2f}%"
-                }
-            else:
-                return {
-                    'customs_value': 0,
-                    'base_duty': 0,
-                    'mpf': 0,
-                    'hmf': 0,
-                    'total_duties': 0,
-                    'total_landed_cost': 0,
-                    'effective_duty_rate': '0.00%'
-                }
-                
-        except Exception as e:
-            return {
-                'customs_value': 0,
-                'base_duty': 0,
-                'mpf': 0,
-                'hmf': 0,
-                'total_duties': 0,
-                'total_landed_cost': 0,
-                'effective_duty_rate': 'Error',
-                'duty_calc_error': str(e)
-            }
+    def _resolve_customs_value(self, row: Dict) -> float:
+        """Determine a row's customs value with flexible column detection"""
+        customs_value = 0
+        
+        # Try multiple ways to determine customs value
+        if pd.notna(row.get('customs_value')):
+            try:
+                customs_value = float(row['customs_value'])
+            except:
+                pass
+        
+        if customs_value == 0 and 'quantity' in row and 'unit_value' in row:
+            try:
+                quantity = float(row.get('quantity', 1)) if pd.notna(row.get('quantity')) else 1
+                unit_value = float(row.get('unit_value', 0)) if pd.notna(row.get('unit_value')) else 0
+                customs_value = quantity * unit_value
+            except:
+                pass
+        
+        if customs_value == 0:
+            # Try to find any column with 'total' or 'value' in it
+            for col, val in row.items():
+                col = str(col)
+                if ('total' in col.lower() or 'value' in col.lower()) and pd.notna(val):
+                    try:
+                        customs_value = float(val)
+                        if customs_value > 0:
+                            break
+                    except:
+                        continue
+        
+        return customs_value
+    
+    def _apply_duties(self, results: pd.DataFrame, positions: np.ndarray, customs_values: np.ndarray,
+                      duty_rates: np.ndarray, shipping_method: str, include_mpf: bool, include_hmf: bool) -> None:
+        """Calculate duties for the given row positions at once and add them as result columns"""
+        rates = np.array([self.duty_calculator.parse_duty_rate(str(rate)) for rate in duty_rates],
+                         dtype=np.float64)
+        
+        duty_calc = self.duty_calculator.calculate_duties_array(
+            customs_values=customs_values,
+            duty_rates=rates,
+            shipping_method=shipping_method,
+            include_mpf=include_mpf,
+            include_hmf=include_hmf
+        )
+        
+        n = len(results)
+        if 'customs_value' in results.columns:
+            customs_column = pd.to_numeric(results['customs_value'], errors='coerce').to_numpy(dtype=np.float64, copy=True)
+        else:
+            customs_column = np.full(n, np.nan)
+        customs_column[positions] = duty_calc['customs_value']
+        results['customs_value'] = customs_column
+        
+        for column, key in [('base_duty', 'base_duty'), ('mpf', 'mpf'), ('hmf', 'hmf'),
+                            ('total_duties', 'total_duties_and_fees'),
+                            ('total_landed_cost', 'total_landed_cost')]:
+            values = np.full(n, np.nan)
+            values[positions] = duty_calc[key]
+            results[column] = values
+        
+        effective = np.full(n, None, dtype=object)
+        effective[positions] = [f"{rate:.2f}%" for rate in duty_calc['effective_duty_rate']]
+        results['effective_duty_rate'] = effective
     
     def create_template(self, include_duty_fields: bool = True) -> bytes:
         """Create a CSV template for batch upload"""
@@ -517,11 +701,20 @@ class EnhancedBatchProcessor:
         
         # Group by origin if available
         if 'origin' in duty_df.columns and duty_df['origin'].notna().any():
+            by_origin = duty_df.groupby('origin')
             summary['duty_by_country'] = {
-                'customs_value': duty_df.groupby('origin')['customs_value'].sum().to_dict(),
-                'total_duties': duty_df.groupby('origin')['total_duties'].sum().to_dict() if 'total_duties' in duty_df else {},
-                'product_name': duty_df.groupby('origin')['product_name'].count().to_dict()
+                'customs_value': by_origin['customs_value'].sum().to_dict(),
+                'total_duties': {},
+                'product_name': by_origin['product_name'].count().to_dict()
             }
+            if 'total_duties' in duty_df:
+                duties_by_origin = by_origin['total_duties'].sum()
+                summary['duty_by_country']['total_duties'] = duties_by_origin.to_dict()
+                # Parallel x/y arrays for the duties-by-country chart
+                summary['duty_by_country_bar'] = {
+                    'countries': duties_by_origin.index.tolist(),
+                    'duties': duties_by_origin.to_numpy(dtype=float).tolist()
+                }
         
         # Group by HS code if available
         if 'hs_code' in duty_df.columns:
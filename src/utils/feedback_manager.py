@@ -1,29 +1,68 @@
-import json
+import atexit
+import threading
 import pandas as pd
 from datetime import datetime
 from pathlib import Path
 
+from src.utils import json_io
+
 class FeedbackManager:
+    # Submissions are buffered and written in one rewrite of the JSON file
+    # every FLUSH_INTERVAL seconds (or once FLUSH_THRESHOLD entries queue up).
+    FLUSH_INTERVAL = 5.0
+    FLUSH_THRESHOLD = 20
+
     def __init__(self, feedback_file='data/feedback/classifications_feedback.json'):
         self.feedback_file = Path(feedback_file)
         self.feedback_file.parent.mkdir(parents=True, exist_ok=True)
+        self._pending = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        # Bumped on every submission; derived views (analytics) cache on it
+        self.version = 0
         
         # Initialize file if it doesn't exist
         if not self.feedback_file.exists():
             self._save_feedback([])
+        
+        threading.Thread(target=self._flush_loop, name="feedback-flush", daemon=True).start()
+        atexit.register(self.flush)
     
     def _load_feedback(self):
-        """Load all feedback records"""
-        try:
-            with open(self.feedback_file, 'r') as f:
-                return json.load(f)
-        except:
-            return []
+        """Load all feedback records, including ones not yet flushed to disk"""
+        # Read under the lock so a concurrent flush can't move entries between the two
+        with self._lock:
+            try:
+                records = json_io.load_file(self.feedback_file)
+            except:
+                records = []
+            return records + self._pending
     
     def _save_feedback(self, feedback_list):
         """Save feedback records"""
-        with open(self.feedback_file, 'w') as f:
-            json.dump(feedback_list, f, indent=2)
+        json_io.dump_file(feedback_list, self.feedback_file)
+    
+    def flush(self):
+        """Write buffered feedback to disk"""
+        with self._lock:
+            if not self._pending:
+                return
+            try:
+                records = json_io.load_file(self.feedback_file)
+            except:
+                records = []
+            records.extend(self._pending)
+            self._save_feedback(records)
+            self._pending = []
+    
+    def _flush_loop(self):
+        while True:
+            self._wakeup.wait(self.FLUSH_INTERVAL)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Feedback flush failed: {e}")
     
     def add_feedback(self, classification_data, user_feedback):
         """
@@ -46,9 +85,11 @@ class FeedbackManager:
             'reasoning': classification_data.get('reasoning', '')
         }
         
-        feedback_list = self._load_feedback()
-        feedback_list.append(feedback_entry)
-        self._save_feedback(feedback_list)
+        with self._lock:
+            self._pending.append(feedback_entry)
+            self.version += 1
+            if len(self._pending) >= self.FLUSH_THRESHOLD:
+                self._wakeup.set()
         
         return feedback_entry['classification_id']
     
@@ -85,27 +126,28 @@ class FeedbackManager:
     
     def export_training_data(self, output_file='data/feedback/training_data.json'):
         """Export feedback as training data for model improvement"""
-        df = self.get_all_feedback()
-        if df.empty:
+        records = self._load_feedback()
+        if not records:
             return None
         
-        # Format for potential retraining
+        # Format for potential retraining; the stored records are already dicts,
+        # so skip the DataFrame round-trip and per-row Series
         training_data = []
-        for _, row in df.iterrows():
+        for row in records:
             if row.get('actual_code'):  # Only include if user provided correct code
+                product_info = row.get('product_info') or {}
                 training_data.append({
                     'input': {
-                        'product_name': row['product_info'].get('product_name', ''),
-                        'description': row['product_info'].get('description', ''),
-                        'material': row['product_info'].get('material', ''),
-                        'use': row['product_info'].get('use', '')
+                        'product_name': product_info.get('product_name', ''),
+                        'description': product_info.get('description', ''),
+                        'material': product_info.get('material', ''),
+                        'use': product_info.get('use', '')
                     },
                     'correct_output': row['actual_code'],
-                    'model_prediction': row['predicted_code'],
-                    'was_correct': row['was_correct']
+                    'model_prediction': row.get('predicted_code'),
+                    'was_correct': row.get('was_correct')
                 })
         
-        with open(output_file, 'w') as f:
-            json.dump(training_data, f, indent=2)
+        json_io.dump_file(training_data, output_file)
         
         return output_file
\ No newline at end of file
@@ -0,0 +1,25 @@
+import threading
+
+try:
+    import google.generativeai as genai
+except Exception:
+    genai = None
+
+_lock = threading.Lock()
+_configured_key = None
+
+
+def configure_genai(api_key: str) -> None:
+    """Configure the process-wide Gemini client once per API key.
+
+    genai.configure() drops the SDK's cached transport clients, so repeated
+    calls from each analyzer's constructor would throw away warm channels
+    that every GenerativeModel shares.
+    """
+    global _configured_key
+    if genai is None:
+        raise RuntimeError("google-generativeai is not installed.")
+    with _lock:
+        if _configured_key != api_key:
+            genai.configure(api_key=api_key)
+            _configured_key = api_key
@@ -0,0 +1,137 @@
+import sqlite3
+import threading
+from collections import deque
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import List, NamedTuple, Optional
+
+import pandas as pd
+
+class HistoryEntry(NamedTuple):
+    """One classification as kept in history; field order matches the table"""
+    timestamp: str
+    product_name: str
+    recommended_code: str
+    duty_rate: str
+    confidence: float
+    needs_review: bool
+    source: str
+
+
+# Column order matches the table; strings and numbers are Arrow-backed so
+# filters, value_counts and st.dataframe work on contiguous buffers.
+HISTORY_DTYPES = {
+    "timestamp": "string[pyarrow]",
+    "product_name": "string[pyarrow]",
+    "recommended_code": "string[pyarrow]",
+    "duty_rate": "string[pyarrow]",
+    "confidence": "float32[pyarrow]",
+    "needs_review": "bool[pyarrow]",
+    "source": "string[pyarrow]",
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS classification_history (
+    session_id TEXT NOT NULL,
+    timestamp TEXT,
+    product_name TEXT,
+    recommended_code TEXT,
+    duty_rate TEXT,
+    confidence REAL,
+    needs_review INTEGER,
+    source TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_history_session ON classification_history (session_id);
+CREATE INDEX IF NOT EXISTS idx_history_timestamp ON classification_history (timestamp);
+"""
+
+
+class HistoryDatabase:
+    """Process-wide SQLite file holding every session's classification history"""
+
+    def __init__(self, db_file='data/history/classification_history.db', retention_days: Optional[int] = 30):
+        self.db_file = Path(db_file)
+        self.db_file.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        # Streamlit serves sessions from many threads; the lock serializes access
+        self._conn = sqlite3.connect(str(self.db_file), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        if retention_days:
+            self.prune(retention_days)
+
+    def prune(self, retention_days: int) -> int:
+        """Delete rows older than retention_days (ISO timestamps compare as text); returns the count"""
+        cutoff = (datetime.now() - timedelta(days=retention_days)).isoformat()
+        with self._lock, self._conn:
+            cur = self._conn.execute(
+                "DELETE FROM classification_history WHERE timestamp IS NULL OR timestamp < ?", (cutoff,)
+            )
+        return cur.rowcount
+
+    def insert(self, session_id: str, entry: HistoryEntry) -> None:
+        columns = ", ".join(HistoryEntry._fields)
+        placeholders = ", ".join("?" for _ in range(len(HistoryEntry._fields) + 1))
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"INSERT INTO classification_history (session_id, {columns}) VALUES ({placeholders})",
+                (session_id, *entry),
+            )
+
+    def count(self, session_id: str) -> int:
+        with self._lock:
+            (n,) = self._conn.execute(
+                "SELECT COUNT(*) FROM classification_history WHERE session_id = ?", (session_id,)
+            ).fetchone()
+        return n
+
+    def fetch_recent(self, session_id: str, limit: int) -> List[HistoryEntry]:
+        columns = ", ".join(HistoryEntry._fields)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {columns} FROM classification_history WHERE session_id = ? "
+                "ORDER BY rowid DESC LIMIT ?", (session_id, limit),
+            ).fetchall()
+        return [HistoryEntry(*row) for row in reversed(rows)]
+
+    def fetch(self, session_id: str) -> pd.DataFrame:
+        columns = ", ".join(HISTORY_DTYPES)
+        with self._lock:
+            df = pd.read_sql_query(
+                f"SELECT {columns} FROM classification_history WHERE session_id = ? ORDER BY rowid",
+                self._conn, params=(session_id,),
+            )
+        return df.astype(HISTORY_DTYPES)
+
+
+class HistoryStore:
+    """One session's view of the history table.
+
+    Every append is written through to SQLite; in memory the session keeps
+    only its count and a bounded ring of the most recent entries, so memory
+    and rerun cost do not grow with the length of the history. session_id is
+    a key that outlives the Streamlit session (the app keeps it in the URL),
+    so a new session with the same id is seeded from disk.
+    """
+
+    def __init__(self, db: HistoryDatabase, session_id: str, recent_size: int = 100):
+        self.db = db
+        self.session_id = session_id
+        self._count = db.count(session_id)
+        self._recent = deque(db.fetch_recent(session_id, recent_size) if self._count else (),
+                             maxlen=recent_size)
+
+    def append(self, entry: HistoryEntry) -> None:
+        self.db.insert(self.session_id, entry)
+        self._count += 1
+        self._recent.append(entry)
+
+    def count(self) -> int:
+        return self._count
+
+    def all(self) -> pd.DataFrame:
+        """Full history, read from disk"""
+        return self.db.fetch(self.session_id)
+
+    def last(self) -> Optional[HistoryEntry]:
+        return self._recent[-1] if self._recent else None
@@ -1,5 +1,6 @@
 import os
 import json
+import mimetypes
 import re
 
 try:
@@ -7,6 +8,10 @@ try:
 except Exception:
     genai = None
 
+from src.utils.genai_client import configure_genai
+
+_JSON_OBJECT_RE = re.compile(r"\{[\s\S]*\}")
+
 
 class ImageAnalyzer:
     """Torch-free analyzer using Gemini Vision to extract product details."""
@@ -18,20 +23,36 @@ class ImageAnalyzer:
         if genai is None:
             raise RuntimeError("google-generativeai is not installed.")
 
-        genai.configure(api_key=api_key)
+        configure_genai(api_key)
         self.model_name = model_name or os.environ.get("GEMINI_IMAGE_MODEL", "gemini-2.5-flash")
         self.model = genai.GenerativeModel(self.model_name)
 
     def _extract_json(self, text: str) -> dict:
-        m = re.search(r"\{[\s\S]*\}", text)
+        m = _JSON_OBJECT_RE.search(text)
         if not m:
             raise ValueError("No JSON object found in model response.")
         return json.loads(m.group(0))
 
-    def analyze_product_image(self, image_path: str) -> dict:
+    def analyze_product_image(self, image) -> dict:
+        """Analyze an image given as a file path, in-memory bytes or a binary file-like."""
+        if isinstance(image, (bytes, bytearray, memoryview)):
+            return self.analyze_product_image_bytes(image)
+        if hasattr(image, "read"):
+            # e.g. a Streamlit UploadedFile or io.BytesIO; never touches disk
+            name = getattr(image, "name", "")
+            mime = getattr(image, "type", None) or mimetypes.guess_type(name)[0] or "image/jpeg"
+            return self.analyze_product_image_bytes(image.read(), mime)
         try:
-            with open(image_path, "rb") as f:
+            with open(image, "rb") as f:
                 img_bytes = f.read()
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+        return self.analyze_product_image_bytes(img_bytes, mimetypes.guess_type(str(image))[0] or "image/jpeg")
+
+    def analyze_product_image_bytes(self, image_bytes, mime: str = "image/jpeg") -> dict:
+        """Analyze in-memory image bytes; mime is the upload's content type (e.g. image/png)."""
+        try:
+            img_bytes = bytes(image_bytes)
 
             prompt = (
                 "From this product image, return STRICT JSON with keys: "
@@ -40,7 +61,7 @@ class ImageAnalyzer:
             )
 
             resp = self.model.generate_content(
-                [prompt, {"mime_type": "image/jpeg", "data": img_bytes}]
+                [prompt, {"mime_type": mime or "image/jpeg", "data": img_bytes}]
             )
             text = getattr(resp, "text", "")
             if not text and getattr(resp, "candidates", None):
@@ -0,0 +1,39 @@
+import json
+
+try:
+    import orjson
+except Exception:
+    orjson = None
+
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+
+def dumps(obj, default=None) -> str:
+    """Pretty-print obj as JSON, using orjson when it is installed"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, default=default, option=_ORJSON_OPTIONS).decode("utf-8")
+        except TypeError:
+            # e.g. ints wider than 64 bits; the stdlib encoder handles those
+            pass
+    return json.dumps(obj, indent=2, ensure_ascii=False, default=default)
+
+
+def loads(data):
+    """Parse JSON text or bytes"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def load_file(path):
+    """Read and parse a JSON file"""
+    with open(path, "rb") as f:
+        return loads(f.read())
+
+
+def dump_file(obj, path, default=None):
+    """Serialize obj to a JSON file"""
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(dumps(obj, default=default))
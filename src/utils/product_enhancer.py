@@ -6,6 +6,7 @@ import json
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
 from config.settings import Config
+from src.utils.genai_client import configure_genai
 
 class ProductEnhancer:
     """Auto-generate product details from product name"""
@@ -14,7 +15,7 @@ class ProductEnhancer:
         if not Config.GOOGLE_API_KEY:
             raise ValueError("GOOGLE_API_KEY not found in environment variables")
         
-        genai.configure(api_key=Config.GOOGLE_API_KEY)
+        configure_genai(Config.GOOGLE_API_KEY)
         
         # Try the configured model first, fallback if it doesn't exist
         models_to_try = [
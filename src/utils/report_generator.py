@@ -2,10 +2,17 @@ from __future__ import annotations
 
 import io
 import os
-import json
+import hashlib
+import threading
 import unicodedata
+from collections import OrderedDict
 from datetime import datetime
 
+try:
+    import blake3
+except ModuleNotFoundError:
+    blake3 = None
+
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
@@ -13,6 +20,15 @@ from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
 
+from src.utils import json_io
+
+
+def content_digest(data: bytes) -> str:
+    """Short content hash used to key cached reports (BLAKE3 when installed)."""
+    if blake3 is not None:
+        return blake3.blake3(data).hexdigest(length=16)
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
 
 class ReportGenerator:
     """
@@ -21,6 +37,11 @@ class ReportGenerator:
     - If no TTF is found, falls back to Helvetica and sanitizes text to Latin-1
     """
 
+    # Rendered PDFs keyed by content digest, shared by all instances.
+    PDF_CACHE_SIZE = 32
+    _pdf_cache: "OrderedDict[str, bytes]" = OrderedDict()
+    _pdf_cache_lock = threading.Lock()
+
     def __init__(self) -> None:
         self.font_name = "Helvetica"
         self.bold_name = "Helvetica-Bold"
@@ -61,9 +82,26 @@ class ReportGenerator:
             "product": product_info,
             "classification": result,
         }
-        return json.dumps(data, indent=2, ensure_ascii=False)
+        return json_io.dumps(data)
 
     def generate_pdf_report(self, result: dict, product_info: dict) -> bytes:
+        # Reruns ask for the same report repeatedly; rebuild only when the content changes.
+        payload = {"font": self.font_name, "result": result, "product": product_info}
+        key = content_digest(json_io.dumps(payload, default=str).encode("utf-8"))
+        with self._pdf_cache_lock:
+            pdf = self._pdf_cache.get(key)
+            if pdf is not None:
+                self._pdf_cache.move_to_end(key)
+                return pdf
+
+        pdf = self._build_pdf_report(result, product_info)
+        with self._pdf_cache_lock:
+            self._pdf_cache[key] = pdf
+            while len(self._pdf_cache) > self.PDF_CACHE_SIZE:
+                self._pdf_cache.popitem(last=False)
+        return pdf
+
+    def _build_pdf_report(self, result: dict, product_info: dict) -> bytes:
         buf = io.BytesIO()
         doc = SimpleDocTemplate(
             buf,
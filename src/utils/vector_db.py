@@ -28,7 +28,8 @@ class VectorDatabase:
         """Upload HTSUS data to Pinecone"""
         vectors = []
         
-        for idx, row in tqdm(df.iterrows(), total=len(df), desc="Upserting HTSUS"):
+        # to_dict('records') builds plain dicts in one pass; iterrows makes a Series per row
+        for idx, row in tqdm(zip(df.index, df.to_dict('records')), total=len(df), desc="Upserting HTSUS"):
             vector = {
                 'id': f"htsus_{idx}",
                 'values': row['embedding'],
@@ -55,7 +56,8 @@ class VectorDatabase:
         """Upload CROSS rulings to Pinecone"""
         vectors = []
         
-        for idx, row in tqdm(df.iterrows(), total=len(df), desc="Upserting CROSS"):
+        # to_dict('records') builds plain dicts in one pass; iterrows makes a Series per row
+        for idx, row in tqdm(zip(df.index, df.to_dict('records')), total=len(df), desc="Upserting CROSS"):
             vector = {
                 'id': f"cross_{idx}",
                 'values': row['embedding'],